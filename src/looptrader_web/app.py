@@ -3,20 +3,30 @@ LoopTrader Web Interface with AdminLTE
 A comprehensive web dashboard for managing LoopTrader Pro bots
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, abort, g, has_request_context
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash, generate_password_hash
 import os
+import re
 import requests
 import json
 import logging
 import time
 import signal
 import subprocess
-from datetime import datetime, timedelta, timezone
-from sqlalchemy import text
+import threading
+import heapq
+import hashlib
+from datetime import date, datetime, timedelta, time as dt_time
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, defaultdict, namedtuple
+from functools import lru_cache
+from operator import attrgetter, itemgetter
+from sqlalchemy import text, case, func, or_, select, lambda_stmt, bindparam, event
 from dotenv import load_dotenv
 import pytz
+import schwab
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -31,15 +41,80 @@ from models.database import (
     get_dashboard_stats, get_recent_positions, get_bots_by_account,
     pause_all_bots, resume_all_bots, close_all_positions, close_position_by_bot,
     SessionLocal, test_connection, update_bot, upsert_trailing_stop, delete_trailing_stop,
-    build_schwab_cache_for_positions
+    upsert_trailing_stops_batch, delete_trailing_stops, bot_status_text,
+    build_schwab_cache_for_positions, engine
 )
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is optional; when installed it replaces the stdlib encoder for jsonify
+# and parses option chain responses
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from sqlalchemy import text
 
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that serializes with orjson, keeping Flask's output format.
+
+    Keys stay sorted and datetimes/Decimals/UUIDs go through Flask's default
+    handler. Numeric keys (strike or bot id maps) are stringified the way the
+    stdlib encoder does it rather than forcing a fallback. Indented (debug)
+    output and anything orjson refuses to encode, such as ints beyond 64 bits,
+    fall back to the stdlib encoder.
+    """
+    option = (orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+              | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        # jsonify asks for compact separators, which is orjson's only format
+        if kwargs.get('separators') == (',', ':'):
+            kwargs.pop('separators')
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=self.option).decode()
+        except (orjson.JSONEncodeError, TypeError):
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Compact responses (everything outside debug) take orjson's bytes as
+        # the body directly instead of decoding them for Flask to re-encode
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = orjson.dumps(obj, default=self.default,
+                                option=self.option | orjson.OPT_APPEND_NEWLINE)
+        except (orjson.JSONEncodeError, TypeError):
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+# Timezones used across request handlers, resolved once at import
+EASTERN_TZ = pytz.timezone('America/New_York')
+CENTRAL_TZ = pytz.timezone('US/Central')
+
+# Regular trading session, compared against the wall-clock time
+MARKET_OPEN_TIME = dt_time(9, 30)
+MARKET_CLOSE_TIME = dt_time(16, 0)
+
+def format_central_timestamp():
+    """Current time in US/Central, e.g. '2025-01-17 02:30 PM CST' (CDT in summer)"""
+    return datetime.now(CENTRAL_TZ).strftime('%Y-%m-%d %I:%M %p %Z')
+
 # Add timezone filter for templates
 @app.template_filter('to_est')
 def to_est(utc_dt):
@@ -47,16 +122,92 @@ def to_est(utc_dt):
     if utc_dt is None:
         return "N/A"
     
-    utc_tz = pytz.UTC
-    est_tz = pytz.timezone('America/New_York')
-    
     # If the datetime is naive, assume it's UTC
     if utc_dt.tzinfo is None:
-        utc_dt = utc_tz.localize(utc_dt)
+        utc_dt = utc_dt.replace(tzinfo=pytz.UTC)
     
     # Convert to EST/EDT
-    est_dt = utc_dt.astimezone(est_tz)
-    return est_dt.strftime('%Y-%m-%d %H:%M EST')
+    return utc_dt.astimezone(EASTERN_TZ).strftime('%Y-%m-%d %H:%M EST')
+
+def _usd(value):
+    """Format a number as a USD string, treating falsy values as zero"""
+    return f"${float(value):,.2f}" if value else "$0.00"
+
+def _signed_pct(value):
+    """Format a number as a signed percentage string"""
+    return f"{value:+.2f}%"
+
+# Option symbols end in the strike price * 1000, e.g. SPXW  250117P05900000
+_STRIKE_RE = re.compile(r'(\d{7})$')
+
+@lru_cache(maxsize=4096)
+def parse_option_symbol(symbol):
+    """Return (strike, underlying) for an option symbol; strike is None if absent.
+
+    The underlying is the part before the first '_' (SPX_12345678C00500000 -> SPX),
+    or the whole symbol when there is none.
+    """
+    match = _STRIKE_RE.search(symbol)
+    strike = int(match.group(1)) / 1000 if match else None
+    return strike, symbol.split("_")[0]
+
+def parse_option_strike(symbol):
+    """Return the strike encoded at the end of an option symbol, or None"""
+    return parse_option_symbol(symbol)[0]
+
+def find_opening_order(position):
+    """Return the order that opened a position, or None"""
+    return next((order for order in position.orders if getattr(order, 'isOpenPosition', False)), None)
+
+def opening_order_risk(opening_order):
+    """Return (notional_risk, underlying) for a position's opening order.
+
+    Notional risk matches looptrader-pro: spread width * quantity * 100 for
+    spreads, strike * quantity * 100 for single legs. The underlying comes from
+    the first leg and is None when that leg has no symbol.
+    """
+    # Note: Instrument model doesn't have strikePrice, so we parse from symbol
+    strikes = []
+    for leg in opening_order.orderLegCollection:
+        if leg.instrument and leg.instrument.symbol:
+            strike_value = parse_option_strike(leg.instrument.symbol)
+            if strike_value is not None:
+                strikes.append(strike_value)
+            else:
+                logger.warning(f"Could not parse strike from symbol {leg.instrument.symbol}")
+    
+    notional_risk = 0.0
+    quantity = opening_order.quantity or opening_order.filledQuantity or 1
+    if len(strikes) >= 2:
+        # For spreads, max risk is the width of the spread
+        spread_width = abs(max(strikes) - min(strikes))
+        notional_risk = spread_width * quantity * 100
+    elif len(strikes) == 1:
+        # For single legs (naked options), use strike as notional
+        notional_risk = strikes[0] * quantity * 100
+    
+    underlying = None
+    if opening_order.orderLegCollection:
+        first_leg = opening_order.orderLegCollection[0]
+        symbol = getattr(first_leg.instrument, 'symbol', "") if first_leg.instrument else ""
+        if symbol:
+            underlying = parse_option_symbol(symbol)[1]
+    
+    return notional_risk, underlying
+
+def risk_position_summary(position, pnl, pnl_pct):
+    """Return the (label, pnl, pnl_pct) tuple shown for best/worst positions"""
+    label = position.bot.name if position.bot else f"Position {position.id}"
+    return label, pnl, pnl_pct
+
+# Column order of the per-position rows summed by sum_risk_metrics
+RISK_METRIC_FIELDS = ('premium_open', 'cost_basis', 'notional_risk',
+                      'delta', 'gamma', 'theta', 'vega', 'pnl')
+
+def sum_risk_metrics(rows):
+    """Column-wise totals of per-position risk metric rows (all 0.0 when empty)"""
+    totals = tuple(map(sum, zip(*rows)))
+    return totals or (0.0,) * len(RISK_METRIC_FIELDS)
 
 # Configure Flask-Login
 login_manager = LoginManager()
@@ -82,6 +233,53 @@ def load_user(user_id):
         return User(ADMIN_USERNAME)
     return None
 
+# Request-scoped database session: opened on first use and closed when the
+# app context is torn down, so a route and its helpers share one connection
+def get_request_db():
+    """Return the database session for the current request"""
+    if 'db' not in g:
+        g.db = SessionLocal()
+    return g.db
+
+@app.teardown_appcontext
+def close_request_db(exc):
+    db = g.pop('db', None)
+    if db is not None:
+        db.close()
+
+# Per-request query accounting, to spot N+1 patterns and slow endpoints.
+# Only queries issued on the request thread are counted.
+QUERY_COUNT_WARN_THRESHOLD = int(os.getenv('QUERY_COUNT_WARN_THRESHOLD', 20))
+QUERY_TIME_WARN_SECONDS = float(os.getenv('QUERY_TIME_WARN_SECONDS', 0.2))
+
+@event.listens_for(engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+@event.listens_for(engine, 'after_cursor_execute')
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context() or not conn.info.get('query_start_time'):
+        return
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    g.query_count = g.get('query_count', 0) + 1
+    g.query_time = g.get('query_time', 0.0) + elapsed
+    if elapsed > g.get('slowest_query_time', 0.0):
+        g.slowest_query_time = elapsed
+        g.slowest_query = statement
+
+@app.after_request
+def log_query_stats(response):
+    query_count = g.get('query_count', 0)
+    query_time = g.get('query_time', 0.0)
+    if query_count > QUERY_COUNT_WARN_THRESHOLD or query_time > QUERY_TIME_WARN_SECONDS:
+        slowest = ' '.join(g.get('slowest_query', '').split())[:200]
+        logger.warning(
+            f"{request.method} {request.endpoint}: {query_count} queries in {query_time:.3f}s "
+            f"(slowest {g.get('slowest_query_time', 0.0):.3f}s: {slowest})"
+        )
+    return response
+
 # Template context processor for common variables
 @app.context_processor
 def inject_template_vars():
@@ -90,26 +288,120 @@ def inject_template_vars():
         'current_year': datetime.now().year
     }
 
+# Short-lived cache for Schwab lookups made on every page load.
+# Balances move slowly, so they can be held longer than the SPX quote.
+SPX_CACHE_TTL_SECONDS = int(os.getenv('SPX_CACHE_TTL', 15))
+BALANCE_CACHE_TTL_SECONDS = int(os.getenv('BALANCE_CACHE_TTL', 45))
+# Account detail also carries open-position P&L, so it is kept for less time
+ACCOUNTS_DETAIL_CACHE_TTL_SECONDS = int(os.getenv('ACCOUNTS_DETAIL_CACHE_TTL', 30))
+# Dashboard stats polled through /api/stats; a few seconds absorbs the
+# polling without the numbers visibly lagging
+DASHBOARD_STATS_CACHE_TTL_SECONDS = int(os.getenv('DASHBOARD_STATS_CACHE_TTL', 5))
+
+class TTLCache:
+    """Thread-safe cache of dict results whose entries expire after a TTL.
+
+    The TTL is given per lookup. With maxsize set, the least recently stored
+    entry is evicted once the cache is full, so caches keyed on request input
+    stay bounded. Values are stored and handed out as shallow copies.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, ttl_seconds):
+        """Return a copy of the entry for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < ttl_seconds:
+                return entry[1].copy()
+        return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value.copy())
+            self._entries.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+    def get_or_fetch(self, key, ttl_seconds, fetch, should_cache=lambda result: result is not None):
+        """Return the cached result for key, calling fetch() when it has expired.
+
+        Only results accepted by should_cache are stored, so failures are
+        retried on the next request instead of being served for the full TTL.
+        """
+        cached = self.get(key, ttl_seconds)
+        if cached is not None:
+            return cached
+        result = fetch()
+        if should_cache(result):
+            self.set(key, result)
+        return result
+
+_latest_store_lock = threading.Lock()
+
+def _remember_latest(store, key, value, maxsize):
+    """Store value under key in an OrderedDict, dropping the oldest keys past maxsize"""
+    with _latest_store_lock:
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > maxsize:
+            store.popitem(last=False)
+
+_schwab_data_cache = TTLCache()
+_dashboard_stats_cache = TTLCache(maxsize=1)
+
+# Schwab API client, built once and shared by all requests. schwab-py
+# refreshes the access token itself and writes it back to token.json; the
+# client is rebuilt whenever the file's mtime changes so a replaced token
+# is picked up without a restart.
+_schwab_client = None
+_schwab_token_mtime = None
+_schwab_client_lock = threading.Lock()
+
+def get_schwab_token_path():
+    """Return the token.json path: the Docker mount, else the project root"""
+    token_path = '/app/token.json'
+    if not os.path.exists(token_path):
+        # Fallback for local development
+        app_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        token_path = os.path.join(app_root, 'token.json')
+    return token_path
+
+def get_schwab_client():
+    """Return the shared Schwab client, (re)creating it when token.json changes"""
+    global _schwab_client, _schwab_token_mtime
+    token_path = get_schwab_token_path()
+    token_mtime = os.path.getmtime(token_path)
+    if _schwab_client is None or token_mtime != _schwab_token_mtime:
+        with _schwab_client_lock:
+            if _schwab_client is None or token_mtime != _schwab_token_mtime:
+                _schwab_client = schwab.auth.client_from_token_file(
+                    token_path,
+                    api_key=os.environ.get('SCHWAB_API_KEY'),
+                    app_secret=os.environ.get('SCHWAB_APP_SECRET'),
+                    enforce_enums=False
+                )
+                _schwab_token_mtime = token_mtime
+    return _schwab_client
+
+# Shared pool for running independent I/O-bound lookups (DB, Schwab) concurrently
+_io_executor = ThreadPoolExecutor(max_workers=int(os.getenv('IO_EXECUTOR_WORKERS', 8)), thread_name_prefix='io')
+
 def get_spx_price():
+    """Get current SPX spot price, cached for SPX_CACHE_TTL_SECONDS"""
+    return _schwab_data_cache.get_or_fetch(
+        'spx_price', SPX_CACHE_TTL_SECONDS, _fetch_spx_price,
+        lambda data: data.get('price') != 'N/A'
+    )
+
+def _fetch_spx_price():
     """Fetch current SPX spot price using Schwab API"""
     try:
-        import schwab
-        from schwab.auth import client_from_token_file
-        
-        # Determine the correct path for token.json
-        if os.path.exists('/app/token.json'):
-            token_path = '/app/token.json'
-        else:
-            app_root = os.path.dirname(os.path.abspath(__file__))
-            token_path = os.path.join(app_root, 'token.json')
-        
-        # Initialize Schwab client
-        client = schwab.auth.client_from_token_file(
-            token_path,
-            api_key=os.environ.get('SCHWAB_API_KEY'),
-            app_secret=os.environ.get('SCHWAB_APP_SECRET'),
-            enforce_enums=False
-        )
+        client = get_schwab_client()
         
         # Get SPX quote from Schwab
         response = client.get_quote('$SPX')
@@ -133,21 +425,14 @@ def get_spx_price():
                 # Schwab provides 52WeekHigh/Low but not market state directly
                 # We'll determine based on time
                 now = datetime.now()
-                market_open = now.replace(hour=9, minute=30, second=0, microsecond=0)
-                market_close = now.replace(hour=16, minute=0, second=0, microsecond=0)
                 
-                if market_open <= now <= market_close and now.weekday() < 5:
+                if now.weekday() < 5 and MARKET_OPEN_TIME <= now.time() <= MARKET_CLOSE_TIME:
                     market_state = 'REGULAR'
                 else:
                     market_state = 'CLOSED'
                 
-                # Convert to US/Central timezone (handles DST automatically)
-                now_utc = datetime.now(timezone.utc)
-                central_tz = pytz.timezone('US/Central')
-                central_time = now_utc.astimezone(central_tz)
-                # Get the current timezone abbreviation (CST or CDT)
-                tz_abbr = central_time.strftime('%Z')
-                timestamp = central_time.strftime(f'%Y-%m-%d %I:%M %p {tz_abbr}')
+                # Timestamp in US/Central (handles DST automatically)
+                timestamp = format_central_timestamp()
                 
                 return {
                     'price': round(price, 2),
@@ -166,21 +451,55 @@ def get_spx_price():
         traceback.print_exc()
     
     # Return default values if API fails
-    now_utc = datetime.now(timezone.utc)
-    central_tz = pytz.timezone('US/Central')
-    central_time = now_utc.astimezone(central_tz)
-    tz_abbr = central_time.strftime('%Z')
-    timestamp = central_time.strftime(f'%Y-%m-%d %I:%M %p {tz_abbr}')
-    
     return {
         'price': 'N/A',
         'change': 'N/A',
         'change_percent': 'N/A',
         'market_state': 'UNKNOWN',
         'previous_close': 'N/A',
-        'timestamp': timestamp
+        'timestamp': format_central_timestamp()
     }
 
+# Optional background refresh of the Schwab caches so page loads never wait
+# on Schwab. Disabled by default so tests and one-off scripts don't spawn threads.
+ENABLE_BACKGROUND_REFRESH = os.environ.get('ENABLE_BACKGROUND_REFRESH', 'false').lower() in ('1', 'true', 'yes')
+SPX_REFRESH_INTERVAL_SECONDS = int(os.getenv('SPX_REFRESH_INTERVAL', 10))
+BALANCE_REFRESH_INTERVAL_SECONDS = int(os.getenv('BALANCE_REFRESH_INTERVAL', 30))
+# Kept below ACCOUNTS_DETAIL_CACHE_TTL_SECONDS so the entry is replaced before it expires
+ACCOUNTS_DETAIL_REFRESH_INTERVAL_SECONDS = int(os.getenv('ACCOUNTS_DETAIL_REFRESH_INTERVAL', 20))
+
+def _schwab_refresher():
+    """Keep the SPX and balance caches warm from a daemon thread"""
+    refreshers = [
+        ('spx_price', SPX_REFRESH_INTERVAL_SECONDS, _fetch_spx_price,
+         lambda data: data.get('price') != 'N/A'),
+        ('account_balance', BALANCE_REFRESH_INTERVAL_SECONDS, _fetch_schwab_account_balance,
+         lambda data: data.get('error') is None),
+        ('accounts_detail', ACCOUNTS_DETAIL_REFRESH_INTERVAL_SECONDS, _fetch_schwab_accounts_detail,
+         lambda data: data.get('error') is None),
+    ]
+    last_run = {}
+    
+    while True:
+        now = time.monotonic()
+        for cache_key, interval, fetch, should_cache in refreshers:
+            if now - last_run.get(cache_key, 0) < interval:
+                continue
+            last_run[cache_key] = now
+            try:
+                result = fetch()
+                if should_cache(result):
+                    _schwab_data_cache.set(cache_key, result)
+            except Exception as e:
+                logger.warning(f"Background refresh of {cache_key} failed: {e}")
+        time.sleep(1)
+
+def start_schwab_refresher():
+    """Start the background Schwab refresher thread"""
+    thread = threading.Thread(target=_schwab_refresher, name='schwab-refresher', daemon=True)
+    thread.start()
+    return thread
+
 # Authentication routes
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -219,52 +538,71 @@ def logout():
 @login_required
 def dashboard():
     try:
-        stats = get_dashboard_stats()
+        # These lookups are independent, so run them concurrently and wait
+        # for the slowest instead of paying for each one in turn
+        stats_future = _io_executor.submit(get_dashboard_stats)
+        connection_future = _io_executor.submit(test_connection)
+        recent_future = _io_executor.submit(get_recent_positions, 5)
+        spx_future = _io_executor.submit(get_spx_price)
+        balance_future = _io_executor.submit(get_schwab_account_balance)
+        
         try:
-            ok, _ = test_connection()
+            ok, _ = connection_future.result()
             db_status = 'connected' if ok else 'error'
         except Exception:
             db_status = 'error'
-        recent_positions = get_recent_positions(5)
-        spx_data = get_spx_price()
-        balance_data = get_schwab_account_balance()
+        stats = stats_future.result()
+        recent_positions = recent_future.result()
+        spx_data = spx_future.result()
+        balance_data = balance_future.result()
         return render_template('dashboard.html', stats=stats, recent_positions=recent_positions, db_status=db_status, spx_data=spx_data, balance_data=balance_data)
     except Exception as e:
         flash(f'Error loading dashboard: {str(e)}', 'danger')
-        now_utc = datetime.now(timezone.utc)
-        cst_time = now_utc - timedelta(hours=6)
-        timestamp = cst_time.strftime('%Y-%m-%d %I:%M %p CST')
+        timestamp = format_central_timestamp()
         return render_template('dashboard.html', stats={}, recent_positions=[], db_status='error', spx_data={'price': 'N/A', 'change': 'N/A', 'change_percent': 'N/A', 'market_state': 'UNKNOWN', 'previous_close': 'N/A', 'timestamp': timestamp}, balance_data={'total_balance': 'N/A', 'error': 'Dashboard load error'})
 
+def tally_bots(bot_lists):
+    """Return (total, active, inactive, paused) counts over lists of bots.
+
+    A bot is active when it is enabled and not paused, inactive otherwise.
+    All four counts come from a single pass over the bots.
+    """
+    total = active = paused = 0
+    for bot_list in bot_lists:
+        total += len(bot_list)
+        for b in bot_list:
+            if b.paused:
+                paused += 1
+            elif b.enabled:
+                active += 1
+    return total, active, total - active, paused
+
 # Bot management routes
 @app.route('/bots')
 @login_required
 def bots():
-    db = SessionLocal()
+    db = get_request_db()
     try:
-        # Eager load all relationships to prevent lazy loading errors
+        # Eager load all relationships to prevent lazy loading errors.
+        # Collections use selectinload (one extra IN query each) rather than
+        # joinedload, which multiplies rows by positions x trailing stops.
+        # The page only counts positions, so only the columns needed for
+        # that are loaded.
         bots_query = (db.query(Bot)
                      .options(
-                         joinedload(Bot.positions),
+                         selectinload(Bot.positions).load_only(
+                             Position.id, Position.bot_id, Position.account_id, Position.active
+                         ),
                          joinedload(Bot.trailing_stop_state)
-                     ))
+                     )
+                     .order_by(Bot.id))
         
-        accounts_query = (db.query(BrokerageAccount)
-                         .options(joinedload(BrokerageAccount.positions)))
+        accounts_query = db.query(BrokerageAccount)
         
         bots = bots_query.all()
         accounts = accounts_query.all()
         accounts_index = {a.account_id: a for a in accounts}
         
-        # Force evaluate all relationships while session is active
-        for bot in bots:
-            _ = list(bot.positions)  # Force loading
-            if bot.trailing_stop_state:
-                _ = bot.trailing_stop_state.id
-        
-        for account in accounts:
-            _ = list(account.positions)  # Force loading
-        
         # Build bots_by_account structure
         class NoAccount:
             def __init__(self):
@@ -272,43 +610,52 @@ def bots():
                 self.name = "No Account"
                 self.account_id = -1
                 self.active_positions = 0  # Pre-computed value
+                self._computed_active_positions = 0
 
         no_account_placeholder = NoAccount()
         bots_by_account = {}
 
+        # Let the database work out which accounts each bot has ever had a
+        # position in, rather than walking every bot's positions in Python.
+        # The pairs are distinct, so a bot lands in each account only once.
+        bot_account_pairs = db.execute(
+            select(Position.bot_id, Position.account_id)
+            .where(Position.account_id.isnot(None))
+            .distinct()
+        ).all()
+        account_ids_by_bot = defaultdict(list)
+        for bot_id, account_id in bot_account_pairs:
+            account_ids_by_bot[bot_id].append(account_id)
+
+        # Bots are ordered by id, so every account's list comes out sorted
         for bot in bots:
-            if bot.positions:
-                # Collect distinct account_ids from ALL positions
-                account_ids = {p.account_id for p in bot.positions if p.account_id is not None}
-                if not account_ids:
+            in_no_account = False
+            for account_id in account_ids_by_bot.get(bot.id, ()):
+                account = accounts_index.get(account_id)
+                if account is not None:
+                    bots_by_account.setdefault(account, []).append(bot)
+                elif not in_no_account:
                     bots_by_account.setdefault(no_account_placeholder, []).append(bot)
-                else:
-                    for aid in account_ids:
-                        account = accounts_index.get(aid)
-                        if account is None:
-                            bots_by_account.setdefault(no_account_placeholder, []).append(bot)
-                        else:
-                            bots_by_account.setdefault(account, []).append(bot)
-            else:
+                    in_no_account = True
+            if bot.id not in account_ids_by_bot:
+                # No position tied to an account
                 bots_by_account.setdefault(no_account_placeholder, []).append(bot)
 
-        # Pre-compute account active_positions while session is still open
+        # Pre-compute account active_positions with one grouped COUNT
+        # instead of loading every account's positions
+        active_counts = dict(db.execute(
+            select(Position.account_id, func.count(Position.id))
+            .where(Position.active == True)
+            .group_by(Position.account_id)
+        ).all())
         for account in bots_by_account.keys():
-            if hasattr(account, 'positions'):  # Real account, not NoAccount
+            if account is not no_account_placeholder:
                 # Compute and store as a simple attribute (not property)
-                account._computed_active_positions = len([p for p in account.positions if p.active])
+                account._computed_active_positions = active_counts.get(account.account_id, 0)
             # else: NoAccount already has active_positions = 0
 
-        # Deduplicate and sort
-        for acct, bot_list in list(bots_by_account.items()):
-            unique = {b.id: b for b in bot_list}
-            sorted_bots = sorted(unique.values(), key=lambda b: b.id)
-            bots_by_account[acct] = sorted_bots
-
         # Unfiltered counts (before any filter) - compute while session is active
-        all_total_bots = sum(len(blist) for blist in bots_by_account.values())
-        all_active_bots = sum(1 for blist in bots_by_account.values() for b in blist if b.enabled and not b.paused)
-        all_inactive_bots = sum(1 for blist in bots_by_account.values() for b in blist if (not b.enabled) or b.paused)
+        all_total_bots, all_active_bots, all_inactive_bots, _ = tally_bots(bots_by_account.values())
 
         flt = request.args.get('filter')  # 'active' | 'inactive' | None
         if flt in ('active', 'inactive'):
@@ -322,9 +669,7 @@ def bots():
                     filtered[account] = subset
             bots_by_account = filtered
 
-        total_bots = sum(len(blist) for blist in bots_by_account.values())
-        active_bots = sum(1 for blist in bots_by_account.values() for b in blist if b.enabled and not b.paused)
-        paused_bots = sum(1 for blist in bots_by_account.values() for b in blist if b.paused)
+        total_bots, active_bots, _, paused_bots = tally_bots(bots_by_account.values())
 
         return render_template('bots/list.html',
                                bots_by_account=bots_by_account,
@@ -348,46 +693,65 @@ def bots():
                                all_total_bots=0, 
                                all_active_bots=0, 
                                all_inactive_bots=0)
-    finally:
-        db.close()
+
+# Hot-path lookups built once as lambda statements so SQLAlchemy can reuse
+# the constructed statement and its compiled form on every request
+_bot_by_id_stmt = lambda_stmt(lambda: select(Bot).where(Bot.id == bindparam('bot_id')))
+_bot_positions_stmt = lambda_stmt(
+    lambda: select(Position)
+    .where(Position.bot_id == bindparam('bot_id'))
+    .order_by(Position.opened_datetime.desc())
+)
 
 @app.route('/bots/<int:bot_id>')
 @login_required
 def bot_detail(bot_id):
     try:
-        db = SessionLocal()
-        try:
-            bot = db.query(Bot).filter(Bot.id == bot_id).first()
-            if not bot:
-                flash('Bot not found', 'danger')
-                return redirect(url_for('bots'))
-            
-            # Get bot positions
-            positions = db.query(Position).filter(Position.bot_id == bot_id).order_by(Position.opened_datetime.desc()).all()
-            
-            return render_template('bots/detail.html', bot=bot, positions=positions)
-        finally:
-            db.close()
+        db = get_request_db()
+        bot = db.execute(_bot_by_id_stmt, {'bot_id': bot_id}).scalar_one_or_none()
+        if not bot:
+            flash('Bot not found', 'danger')
+            return redirect(url_for('bots'))
+        
+        # Get bot positions
+        positions = db.execute(_bot_positions_stmt, {'bot_id': bot_id}).scalars().all()
+        
+        return render_template('bots/detail.html', bot=bot, positions=positions)
     except Exception as e:
         flash(f'Error loading bot: {str(e)}', 'danger')
         return redirect(url_for('bots'))
 
 # Bot action routes
+def _parse_bot_ids(raw_ids):
+    """Convert submitted bot ids to ints, skipping invalid values"""
+    ids = []
+    for bot_id in raw_ids:
+        try:
+            ids.append(int(bot_id))
+        except ValueError:
+            continue  # Skip invalid bot IDs
+    return ids
+
+def _resumed_bot_state():
+    """SQL expression for a bot's state after resuming from pause.
+
+    Bots still INITIALIZING are moved to SLEEPING; any other state is kept.
+    """
+    return case((func.upper(Bot.state) == 'INITIALIZING', 'SLEEPING'), else_=Bot.state)
+
 @app.route('/bots/<int:bot_id>/pause', methods=['POST'])
 @login_required
 def pause_bot(bot_id):
     try:
-        db = SessionLocal()
-        try:
-            bot = db.query(Bot).filter(Bot.id == bot_id).first()
-            if bot:
-                bot.paused = True
-                db.commit()
-                return jsonify({'success': True, 'message': 'Bot paused successfully'})
-            else:
-                return jsonify({'success': False, 'message': 'Bot not found'})
-        finally:
-            db.close()
+        db = get_request_db()
+        updated = (db.query(Bot)
+                   .filter(Bot.id == bot_id)
+                   .update({Bot.paused: True}, synchronize_session=False))
+        db.commit()
+        if updated:
+            return jsonify({'success': True, 'message': 'Bot paused successfully'})
+        else:
+            return jsonify({'success': False, 'message': 'Bot not found'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
@@ -395,20 +759,17 @@ def pause_bot(bot_id):
 @login_required
 def resume_bot(bot_id):
     try:
-        db = SessionLocal()
-        try:
-            bot = db.query(Bot).filter(Bot.id == bot_id).first()
-            if bot:
-                bot.paused = False
-                # Set state to SLEEPING when resuming from pause
-                if bot.state.upper() == 'INITIALIZING':
-                    bot.state = 'SLEEPING'
-                db.commit()
-                return jsonify({'success': True, 'message': 'Bot resumed successfully'})
-            else:
-                return jsonify({'success': False, 'message': 'Bot not found'})
-        finally:
-            db.close()
+        db = get_request_db()
+        # Set state to SLEEPING when resuming from pause
+        updated = (db.query(Bot)
+                   .filter(Bot.id == bot_id)
+                   .update({Bot.paused: False, Bot.state: _resumed_bot_state()},
+                           synchronize_session=False))
+        db.commit()
+        if updated:
+            return jsonify({'success': True, 'message': 'Bot resumed successfully'})
+        else:
+            return jsonify({'success': False, 'message': 'Bot not found'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
@@ -416,18 +777,15 @@ def resume_bot(bot_id):
 @login_required
 def enable_bot(bot_id):
     try:
-        db = SessionLocal()
-        try:
-            bot = db.query(Bot).filter(Bot.id == bot_id).first()
-            if bot:
-                bot.enabled = True
-                bot.paused = False
-                db.commit()
-                return jsonify({'success': True, 'message': 'Bot enabled successfully'})
-            else:
-                return jsonify({'success': False, 'message': 'Bot not found'})
-        finally:
-            db.close()
+        db = get_request_db()
+        updated = (db.query(Bot)
+                   .filter(Bot.id == bot_id)
+                   .update({Bot.enabled: True, Bot.paused: False}, synchronize_session=False))
+        db.commit()
+        if updated:
+            return jsonify({'success': True, 'message': 'Bot enabled successfully'})
+        else:
+            return jsonify({'success': False, 'message': 'Bot not found'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
@@ -480,7 +838,8 @@ def upsert_trailing_stop_route(bot_id):
             activation_threshold, 
             trailing_percentage=trailing_percentage if trailing_mode == 'percentage' else None,
             trailing_dollar_amount=trailing_dollar_amount if trailing_mode == 'dollar' else None,
-            trailing_mode=trailing_mode
+            trailing_mode=trailing_mode,
+            session=get_request_db()
         )
         
         if ok:
@@ -496,7 +855,7 @@ def upsert_trailing_stop_route(bot_id):
 @login_required
 def delete_trailing_stop_route(bot_id):
     try:
-        ok, msg = delete_trailing_stop(bot_id)
+        ok, msg = delete_trailing_stop(bot_id, session=get_request_db())
         if ok:
             flash('Trailing stop removed', 'success')
         else:
@@ -541,24 +900,16 @@ def pause_selected():
         if not bot_ids:
             return jsonify({'success': False, 'message': 'No bots selected'})
         
-        # Convert to integers and pause each bot
+        # Pause every selected bot that isn't already paused in one UPDATE
+        ids = _parse_bot_ids(bot_ids)
+        db = get_request_db()
         count = 0
-        db = SessionLocal()
-        try:
-            for bot_id in bot_ids:
-                try:
-                    bot_id_int = int(bot_id)
-                    bot = db.query(Bot).filter(Bot.id == bot_id_int).first()
-                    if bot and not bot.paused:
-                        bot.paused = True
-                        count += 1
-                except ValueError:
-                    continue  # Skip invalid bot IDs
-            
-            db.commit()
-            return jsonify({'success': True, 'count': count, 'message': f'{count} bots paused successfully'})
-        finally:
-            db.close()
+        if ids:
+            count = (db.query(Bot)
+                     .filter(Bot.id.in_(ids), or_(Bot.paused == False, Bot.paused.is_(None)))
+                     .update({Bot.paused: True}, synchronize_session=False))
+        db.commit()
+        return jsonify({'success': True, 'count': count, 'message': f'{count} bots paused successfully'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
@@ -570,27 +921,17 @@ def resume_selected():
         if not bot_ids:
             return jsonify({'success': False, 'message': 'No bots selected'})
         
-        # Convert to integers and resume each bot
+        # Resume every selected paused bot in one UPDATE
+        ids = _parse_bot_ids(bot_ids)
+        db = get_request_db()
         count = 0
-        db = SessionLocal()
-        try:
-            for bot_id in bot_ids:
-                try:
-                    bot_id_int = int(bot_id)
-                    bot = db.query(Bot).filter(Bot.id == bot_id_int).first()
-                    if bot and bot.paused:
-                        bot.paused = False
-                        # Set state to SLEEPING when resuming from pause
-                        if bot.state.upper() == 'INITIALIZING':
-                            bot.state = 'SLEEPING'
-                        count += 1
-                except ValueError:
-                    continue  # Skip invalid bot IDs
-            
-            db.commit()
-            return jsonify({'success': True, 'count': count, 'message': f'{count} bots resumed successfully'})
-        finally:
-            db.close()
+        if ids:
+            count = (db.query(Bot)
+                     .filter(Bot.id.in_(ids), Bot.paused == True)
+                     .update({Bot.paused: False, Bot.state: _resumed_bot_state()},
+                             synchronize_session=False))
+        db.commit()
+        return jsonify({'success': True, 'count': count, 'message': f'{count} bots resumed successfully'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
@@ -645,17 +986,16 @@ def positions():
                 include_closed=(not active_only_bool)
             )
             
-            # Get accounts for account name lookup (optimized with dict)
-            accounts = db.query(BrokerageAccount).all()
-            account_map = {acc.account_id: acc.name for acc in accounts}
-            
-            # Get bots for bot name lookup (optimized with dict)
-            bots = db.query(Bot).all()
-            bot_map = {bot.id: bot for bot in bots}
+            # Account and bot names for lookup. Only the two columns needed are
+            # selected so no full ORM objects are built for these tables.
+            account_map = dict(db.execute(select(BrokerageAccount.account_id, BrokerageAccount.name)).all())
+            bot_names = dict(db.execute(select(Bot.id, Bot.name)).all())
             
             # Collect valid positions and extract data
             valid_positions = []
+            active_positions = []  # Subset needing live Schwab quotes
             position_data = []  # Enhanced data with entry/current prices, strikes, etc.
+            now = datetime.now(timezone.utc)
             
             for db_position in all_positions:
                 try:
@@ -664,10 +1004,7 @@ def positions():
                         continue
                     
                     # Validate position has opening order with orderLegCollection and price (matches looptrader-pro)
-                    opening_order = next(
-                        (order for order in db_position.orders if hasattr(order, 'isOpenPosition') and order.isOpenPosition),
-                        None
-                    )
+                    opening_order = find_opening_order(db_position)
                     
                     if opening_order is None or not opening_order.orderLegCollection or opening_order.price is None:
                         if db_position.active:
@@ -677,25 +1014,22 @@ def positions():
                     
                     # Position is valid, add to list
                     valid_positions.append(db_position)
+                    if db_position.active:
+                        active_positions.append(db_position)
                     
                     # Extract additional data for display (matching looptrader-pro format)
                     # Get strikes from symbols
                     position_strikes = []
                     for leg in opening_order.orderLegCollection:
                         if leg.instrument and leg.instrument.symbol:
-                            symbol = leg.instrument.symbol
-                            try:
-                                if len(symbol) >= 7:
-                                    strike_part = symbol[-7:]
-                                    strike_value = float(strike_part) / 1000
-                                    position_strikes.append(f"${strike_value:.0f}")
-                            except (ValueError, IndexError):
-                                continue
+                            strike_value = parse_option_strike(leg.instrument.symbol)
+                            if strike_value is not None:
+                                position_strikes.append(f"${strike_value:.0f}")
                     
                     strikes_str = "/".join(position_strikes) if position_strikes else "N/A"
                     
                     # Calculate entry price per contract
-                    quantity = opening_order.quantity if opening_order.quantity else opening_order.filledQuantity or 1
+                    quantity = opening_order.quantity or opening_order.filledQuantity or 1
                     entry_price_per_contract = abs(opening_order.price) if opening_order.price else 0.0
                     
                     # Calculate duration
@@ -705,20 +1039,16 @@ def positions():
                         entry_time = db_position.opened_datetime
                         if entry_time.tzinfo is None:
                             entry_time = entry_time.replace(tzinfo=timezone.utc)
-                        now = datetime.now(timezone.utc)
-                        duration = now - entry_time
-                        hours = int(duration.total_seconds() / 3600)
-                        minutes = int((duration.total_seconds() % 3600) / 60)
-                        duration_text = f"{hours}h {minutes}m"
+                        hours, remainder = divmod(int((now - entry_time).total_seconds()), 3600)
+                        duration_text = f"{hours}h {remainder // 60}m"
                         entry_time_str = entry_time.strftime("%H:%M ET")
                     
                     # Get account name (optimized dictionary lookup)
                     account_name = account_map.get(db_position.account_id, "Unknown")
                     
                     # Get bot info (optimized dictionary lookup)
-                    bot = bot_map.get(db_position.bot_id)
                     bot_id = db_position.bot_id
-                    bot_name = bot.name if bot else f"Bot {bot_id}"
+                    bot_name = bot_names.get(bot_id, f"Bot {bot_id}")
                     
                     # Store enhanced position data
                     position_data.append({
@@ -744,7 +1074,6 @@ def positions():
             
             # Build Schwab cache for active positions to get real-time market values
             # This matches looptrader-pro /positions command approach
-            active_positions = [p for p in valid_positions if p.active]
             if active_positions:
                 try:
                     from models.database import build_schwab_cache_for_positions
@@ -757,97 +1086,80 @@ def positions():
                     logger.error(f"Error building Schwab cache: {e}", exc_info=True)
                     # Continue without cache - positions will use fallback calculation
             
-            # Calculate per-account and overall summaries (matching looptrader-pro)
-            from collections import defaultdict
-            account_groups = defaultdict(list)
+            # Resolve P&L once per active position; the properties below are
+            # otherwise re-evaluated by every summary pass and the sort
             for pos_data in position_data:
-                account_name = pos_data['account_name']
-                account_groups[account_name].append(pos_data)
+                position = pos_data['position']
+                pos_data['_pnl'] = None
+                pos_data['_pnl_pct'] = None
+                # Inactive positions sort last
+                pos_data['_sort_key'] = float('inf')
+                if not position.active:
+                    continue
+                try:
+                    pos_data['_pnl'] = position.current_pnl
+                except Exception as e:
+                    logger.warning(f"Error calculating P&L for position {position.id}: {e}")
+                try:
+                    pos_data['_pnl_pct'] = position.current_pnl_percent
+                except Exception as e:
+                    logger.warning(f"Error calculating P&L % for position {position.id}: {e}")
+                pos_data['_sort_key'] = pos_data['_pnl_pct'] if pos_data['_pnl_pct'] is not None else 0.0
             
+            # Calculate per-account and overall summaries (matching looptrader-pro)
+            # in one pass, accumulating straight into each account's summary
             account_summaries = {}
+            account_pct_counts = defaultdict(int)
+            total_pnl_pct_sum = 0.0  # For calculating average percentage
+            
+            for p in position_data:
+                summary = account_summaries.get(p['account_name'])
+                if summary is None:
+                    summary = account_summaries[p['account_name']] = {
+                        'pnl': 0.0, 'avg_pct': 0.0, 'winning': 0, 'losing': 0, 'count': 0
+                    }
+                if not p['position'].active:
+                    continue
+                summary['count'] += 1
+                pnl = p['_pnl']
+                if pnl is not None:
+                    summary['pnl'] += pnl
+                    if pnl > 0:
+                        summary['winning'] += 1
+                    elif pnl < 0:
+                        summary['losing'] += 1
+                if p['_pnl_pct'] is not None:
+                    # Running sum for now; turned into an average below
+                    summary['avg_pct'] += p['_pnl_pct']
+                    account_pct_counts[p['account_name']] += 1
+                    total_pnl_pct_sum += p['_pnl_pct']
+            
             total_pnl = 0.0
             total_count = 0
             total_winning = 0
             total_losing = 0
-            total_pnl_pct_sum = 0.0  # For calculating average percentage
-            
-            for account_name, positions_list in account_groups.items():
-                account_pnl = 0.0
-                account_positions_active = [p for p in positions_list if p['position'].active]
-                for p in account_positions_active:
-                    try:
-                        account_pnl += p['position'].current_pnl
-                    except Exception as e:
-                        logger.warning(f"Error calculating P&L for position {p['position'].id}: {e}")
-                        continue
-                
-                account_avg_pct = 0.0
-                if account_positions_active:
-                    pct_sum = 0.0
-                    pct_count = 0
-                    for p in account_positions_active:
-                        try:
-                            pct_sum += p['position'].current_pnl_percent
-                            pct_count += 1
-                        except Exception as e:
-                            logger.warning(f"Error calculating P&L % for position {p['position'].id}: {e}")
-                            continue
-                    account_avg_pct = (pct_sum / pct_count) if pct_count > 0 else 0.0
-                
-                account_winning = 0
-                account_losing = 0
-                for p in account_positions_active:
-                    try:
-                        if p['position'].current_pnl > 0:
-                            account_winning += 1
-                        elif p['position'].current_pnl < 0:
-                            account_losing += 1
-                    except Exception as e:
-                        logger.warning(f"Error checking win/loss for position {p['position'].id}: {e}")
-                        continue
-                
-                account_summaries[account_name] = {
-                    'pnl': account_pnl,
-                    'avg_pct': account_avg_pct,
-                    'winning': account_winning,
-                    'losing': account_losing,
-                    'count': len(account_positions_active)
-                }
-                
-                total_pnl += account_pnl
-                total_count += len(account_positions_active)
-                total_winning += account_winning
-                total_losing += account_losing
-                for p in account_positions_active:
-                    try:
-                        total_pnl_pct_sum += p['position'].current_pnl_percent
-                    except Exception as e:
-                        logger.warning(f"Error calculating total P&L % for position {p['position'].id}: {e}")
-                        continue
+            for account_name, summary in account_summaries.items():
+                pct_count = account_pct_counts[account_name]
+                summary['avg_pct'] = (summary['avg_pct'] / pct_count) if pct_count > 0 else 0.0
+                total_pnl += summary['pnl']
+                total_count += summary['count']
+                total_winning += summary['winning']
+                total_losing += summary['losing']
             
             # Calculate overall average P&L percentage
             avg_pnl_pct = (total_pnl_pct_sum / total_count) if total_count > 0 else 0.0
             
             # Sort positions by P&L percentage (worst to best, matching looptrader-pro)
-            def get_sort_key(x):
-                if not x['position'].active:
-                    return float('inf')
-                try:
-                    return x['position'].current_pnl_percent
-                except Exception as e:
-                    logger.warning(f"Error getting P&L % for sorting position {x['position'].id}: {e}")
-                    return 0.0
-            position_data.sort(key=get_sort_key)
+            position_data.sort(key=itemgetter('_sort_key'))
             
             # Pass the active_only flag to template for button styling
             # Ensure active_only is a boolean
             active_only_bool = (active_only == 'true') if active_only else False
             
             return render_template('positions/list.html', 
-                                 positions=valid_positions,
-                                 position_data=position_data,  # Enhanced data
-                                 accounts=accounts, 
-                                 bots=bots,
+                                 position_data=position_data,  # Enhanced data (embeds each position)
+                                 accounts=account_map, 
+                                 bots=bot_names,
                                  account_summaries=account_summaries,
                                  total_pnl=total_pnl,
                                  total_count=total_count,
@@ -861,7 +1173,6 @@ def positions():
         logger.error(f"Error in positions route: {str(e)}", exc_info=True)
         flash(f'Error loading positions: {str(e)}', 'danger')
         return render_template('positions/list.html', 
-                             positions=[], 
                              position_data=[],
                              accounts=[], 
                              bots=[],
@@ -880,29 +1191,25 @@ def risk():
     try:
         db = SessionLocal()
         try:
-            from sqlalchemy.orm import joinedload
-            
             # Query positions using batch query with caching
             from models.database import get_positions_batch
             
-            # Get accounts for account metrics grouping
-            accounts = db.query(BrokerageAccount).all()
+            # Get accounts for account metrics grouping (only the columns used)
+            accounts = db.execute(select(BrokerageAccount.account_id, BrokerageAccount.name)).all()
             
             # Get all active positions in a single batch query (with caching)
             all_positions = get_positions_batch(active_only=True)
             
             # Collect valid active positions (filter out those without valid opening orders)
             active_positions = []
+            opening_order_by_pid = {}
             for db_position in all_positions:
                 try:
                     if not db_position.active:
                         continue
                     
                     # Validate position has opening order with orderLegCollection (matches looptrader-pro)
-                    opening_order = next(
-                        (order for order in db_position.orders if hasattr(order, 'isOpenPosition') and order.isOpenPosition),
-                        None
-                    )
+                    opening_order = find_opening_order(db_position)
                     
                     if opening_order is None or not opening_order.orderLegCollection:
                         bot_name = db_position.bot.name if db_position.bot else f"Bot {db_position.bot_id}"
@@ -911,6 +1218,7 @@ def risk():
                     
                     # Position is valid, add to list
                     active_positions.append(db_position)
+                    opening_order_by_pid[db_position.id] = opening_order
                     
                 except Exception as e:
                     bot_name = db_position.bot.name if db_position.bot else f"Bot {db_position.bot_id}"
@@ -935,59 +1243,33 @@ def risk():
             # Initialize Schwab client once for all positions
             schwab_client = None
             try:
-                import os
-                import schwab
-                from schwab.auth import client_from_token_file
-                
-                token_path = os.path.join('/app', 'token.json')
-                if not os.path.exists(token_path):
-                    app_root = os.path.dirname(os.path.dirname(__file__))
-                    token_path = os.path.join(app_root, 'token.json')
-                
-                if os.path.exists(token_path):
-                    api_key = os.getenv('SCHWAB_API_KEY')
-                    app_secret = os.getenv('SCHWAB_APP_SECRET')
-                    
-                    if api_key and app_secret:
-                        schwab_client = client_from_token_file(token_path, api_key, app_secret)
-                        logger.debug("Schwab client initialized for live Greeks")
-                    else:
-                        logger.warning("Missing SCHWAB credentials")
+                if os.getenv('SCHWAB_API_KEY') and os.getenv('SCHWAB_APP_SECRET'):
+                    schwab_client = get_schwab_client()
+                    logger.debug("Schwab client ready for live Greeks")
                 else:
-                    logger.warning(f"No token.json found at {token_path}")
+                    logger.warning("Missing SCHWAB credentials")
             except Exception as e:
                 logger.error(f"Failed to initialize Schwab client: {e}", exc_info=True)
             
-            # Initialize aggregates matching looptrader-pro's /risk command
-            total_delta = 0.0
-            total_gamma = 0.0
-            total_theta = 0.0
-            total_vega = 0.0
-            total_notional_risk = 0.0  # Max risk from spread widths (matches looptrader-pro)
-            total_premium_open = 0.0  # Current market value (cost to close)
-            total_pnl = 0.0
-            total_cost_basis = 0.0  # Initial investment (for percentage)
-            
-            best_position = None
-            worst_position = None
-            best_pnl_pct = float('-inf')
-            worst_pnl_pct = float('inf')
-            
             # Underlying concentration: track count per underlying (matches looptrader-pro)
-            underlying_concentration = {}
+            underlying_concentration = defaultdict(int)
             
             # Batch fetch Greeks for all positions in a single API call
             from models.database import get_greeks_for_all_positions
-            greeks_cache = get_greeks_for_all_positions(active_positions, schwab_client)
+            greeks_cache = get_greeks_for_all_positions(active_positions, schwab_client, opening_order_by_pid)
             logger.info(f"Fetched Greeks for {len(greeks_cache)} positions in batched API call")
             
+            # One RISK_METRIC_FIELDS row per position; portfolio and per-account
+            # totals are column sums over these rows
+            position_metrics = {}
+            position_underlyings = {}
+            # (position, pnl, pnl_pct) for picking best/worst after the loop
+            position_returns = []
+            
             for pos in active_positions:
                 try:
                     # Get opening order (already validated above)
-                    opening_order = next(
-                        (o for o in pos.orders if hasattr(o, 'isOpenPosition') and o.isOpenPosition),
-                        None
-                    )
+                    opening_order = opening_order_by_pid.get(pos.id)
                     
                     if not opening_order or not opening_order.orderLegCollection:
                         logger.warning(f"Position {pos.id} missing opening order, skipping")
@@ -997,159 +1279,75 @@ def risk():
                     initial_premium = pos.initial_premium_sold
                     # Current market value (cost to close position)
                     current_open_premium = pos.current_open_premium
-                    # Cost basis for percentage calculation (always positive)
-                    cost_basis = abs(initial_premium)
-                    
-                    total_premium_open += current_open_premium
-                    total_cost_basis += cost_basis
-                    
-                    # Calculate notional risk (spread width * quantity * 100) matching looptrader-pro
-                    # Extract strikes from order legs to calculate spread width
-                    # Note: Instrument model doesn't have strikePrice, so we parse from symbol
-                    strikes = []
-                    for leg in opening_order.orderLegCollection:
-                        if leg.instrument and leg.instrument.symbol:
-                            # Parse strike from symbol: SPX_12345678C00500000 -> 5000.0
-                            # Format: SYMBOL_YYYYMMDDCPPPPPPPP where PPPPPPPP is strike * 1000
-                            symbol = leg.instrument.symbol
-                            try:
-                                if len(symbol) >= 7:
-                                    strike_part = symbol[-7:]  # Last 7 characters
-                                    strike_value = float(strike_part) / 1000
-                                    strikes.append(strike_value)
-                            except (ValueError, IndexError):
-                                # If parsing fails, try to get from description or skip
-                                logger.warning(f"Could not parse strike from symbol {symbol}")
-                                continue
                     
-                    position_notional_risk = 0.0
-                    if len(strikes) >= 2:
-                        # For spreads, max risk is the width of the spread
-                        spread_width = abs(max(strikes) - min(strikes))
-                        quantity = opening_order.quantity if opening_order.quantity else opening_order.filledQuantity or 1
-                        position_notional_risk = spread_width * quantity * 100
-                    elif len(strikes) == 1:
-                        # For single legs (naked options), use strike as notional
-                        quantity = opening_order.quantity if opening_order.quantity else opening_order.filledQuantity or 1
-                        position_notional_risk = strikes[0] * quantity * 100
+                    # P&L
+                    pnl = pos.current_pnl
+                    pnl_pct = pos.current_pnl_percent
                     
-                    total_notional_risk += position_notional_risk
+                    # Notional risk and underlying, parsed once per position
+                    position_notional_risk, position_underlying = opening_order_risk(opening_order)
                     
                     # Greeks from batched API call (already fetched above)
                     greeks = greeks_cache.get(pos.id, {'delta': 0.0, 'gamma': 0.0, 'theta': 0.0, 'vega': 0.0})
                     logger.debug(f"Position {pos.id}: Greeks = Δ{greeks['delta']:.2f}, Γ{greeks['gamma']:.3f}, Θ{greeks['theta']:.2f}, V{greeks['vega']:.2f}, Notional=${position_notional_risk:.2f}")
                     
-                    total_delta += greeks['delta']
-                    total_gamma += greeks['gamma']
-                    total_theta += greeks['theta']
-                    total_vega += greeks['vega']
-                    
-                    # P&L
-                    pnl = pos.current_pnl
-                    pnl_pct = pos.current_pnl_percent
-                    total_pnl += pnl
-                    
-                    # Track best/worst
-                    if pnl_pct > best_pnl_pct:
-                        best_pnl_pct = pnl_pct
-                        best_position = (pos.bot.name if pos.bot else f"Position {pos.id}", pnl, pnl_pct)
-                    
-                    if pnl_pct < worst_pnl_pct:
-                        worst_pnl_pct = pnl_pct
-                        worst_position = (pos.bot.name if pos.bot else f"Position {pos.id}", pnl, pnl_pct)
+                    position_metrics[pos.id] = (
+                        current_open_premium,
+                        abs(initial_premium),  # Cost basis for percentage (always positive)
+                        position_notional_risk,
+                        greeks['delta'],
+                        greeks['gamma'],
+                        greeks['theta'],
+                        greeks['vega'],
+                        pnl,
+                    )
+                    position_underlyings[pos.id] = position_underlying
+                    position_returns.append((pos, pnl, pnl_pct))
                     
                     # Underlying concentration (matches looptrader-pro: just count positions)
-                    # Determine underlying symbol from first leg
-                    underlying_symbol = "UNKNOWN"
-                    if opening_order.orderLegCollection:
-                        first_leg = opening_order.orderLegCollection[0]
-                        if first_leg.instrument:
-                            # Extract underlying from symbol (remove option suffixes)
-                            symbol = first_leg.instrument.symbol if hasattr(first_leg.instrument, 'symbol') else ""
-                            if symbol:
-                                # Symbol format: SPX_12345678C00500000 -> SPX
-                                underlying_symbol = symbol.split("_")[0] if "_" in symbol else symbol
-                    
-                    if underlying_symbol not in underlying_concentration:
-                        underlying_concentration[underlying_symbol] = 0
-                    underlying_concentration[underlying_symbol] += 1
+                    underlying_concentration[position_underlying or "UNKNOWN"] += 1
                     
                 except Exception as e:
                     logger.error(f"Error calculating metrics for position {pos.id}: {e}", exc_info=True)
                     continue  # Skip this position but continue with others
             
+            # Aggregates matching looptrader-pro's /risk command. Notional risk is
+            # the max risk from spread widths, premium open the current market
+            # value (cost to close) and cost basis the initial investment.
+            (total_premium_open, total_cost_basis, total_notional_risk,
+             total_delta, total_gamma, total_theta, total_vega,
+             total_pnl) = sum_risk_metrics(position_metrics.values())
+            
+            # Best/worst by P&L %; max/min keep the first position on ties
+            best_position = None
+            worst_position = None
+            if position_returns:
+                best_position = risk_position_summary(*max(position_returns, key=itemgetter(2)))
+                worst_position = risk_position_summary(*min(position_returns, key=itemgetter(2)))
+            
             logger.debug(f"Total premium_open = ${total_premium_open:.2f}, Cost_basis = ${total_cost_basis:.2f}, Total Greeks: Δ{total_delta:.2f}, Γ{total_gamma:.3f}, Θ{total_theta:.2f}, V{total_vega:.2f}")
             
             # Group by account (for aggregate mode)
+            positions_by_account = defaultdict(list)
+            for p in active_positions:
+                positions_by_account[p.account_id].append(p)
+            
             account_metrics = {}
             for account in accounts:
-                account_positions = [p for p in active_positions if p.account_id == account.account_id]
-                account_premium_open = 0.0
-                account_cost_basis = 0.0
-                account_notional_risk = 0.0
-                account_delta = 0.0
-                account_gamma = 0.0
-                account_theta = 0.0
-                account_vega = 0.0
-                account_pnl = 0.0
-                account_underlyings = {}  # Track underlying concentration per account
+                account_positions = positions_by_account.get(account.account_id, [])
+                # Use the same values as portfolio totals
+                (account_premium_open, account_cost_basis, account_notional_risk,
+                 account_delta, account_gamma, account_theta, account_vega,
+                 account_pnl) = sum_risk_metrics(
+                    position_metrics[p.id] for p in account_positions if p.id in position_metrics
+                )
                 
+                # Track underlying concentration for this account
+                account_underlyings = defaultdict(int)
                 for p in account_positions:
-                    try:
-                        # Use the same pattern as portfolio totals
-                        initial_prem = p.initial_premium_sold
-                        current_open = p.current_open_premium
-                        account_premium_open += current_open
-                        account_cost_basis += abs(initial_prem)
-                        
-                        # Calculate notional risk for this position
-                        opening_order = next(
-                            (o for o in p.orders if hasattr(o, 'isOpenPosition') and o.isOpenPosition),
-                            None
-                        )
-                        if opening_order and opening_order.orderLegCollection:
-                            strikes = []
-                            for leg in opening_order.orderLegCollection:
-                                if leg.instrument and leg.instrument.symbol:
-                                    # Parse strike from symbol (same as portfolio totals)
-                                    symbol = leg.instrument.symbol
-                                    try:
-                                        if len(symbol) >= 7:
-                                            strike_part = symbol[-7:]
-                                            strike_value = float(strike_part) / 1000
-                                            strikes.append(strike_value)
-                                    except (ValueError, IndexError):
-                                        continue
-                            
-                            if len(strikes) >= 2:
-                                spread_width = abs(max(strikes) - min(strikes))
-                                quantity = opening_order.quantity if opening_order.quantity else opening_order.filledQuantity or 1
-                                account_notional_risk += spread_width * quantity * 100
-                            elif len(strikes) == 1:
-                                quantity = opening_order.quantity if opening_order.quantity else opening_order.filledQuantity or 1
-                                account_notional_risk += strikes[0] * quantity * 100
-                            
-                            # Track underlying concentration for this account
-                            if opening_order.orderLegCollection:
-                                first_leg = opening_order.orderLegCollection[0]
-                                if first_leg.instrument:
-                                    symbol = first_leg.instrument.symbol if hasattr(first_leg.instrument, 'symbol') else ""
-                                    if symbol:
-                                        underlying_symbol = symbol.split("_")[0] if "_" in symbol else symbol
-                                        if underlying_symbol not in account_underlyings:
-                                            account_underlyings[underlying_symbol] = 0
-                                        account_underlyings[underlying_symbol] += 1
-                        
-                        # Use cached Greeks to avoid duplicate broker calls
-                        greeks = greeks_cache.get(p.id, {'delta': 0.0, 'gamma': 0.0, 'theta': 0.0, 'vega': 0.0})
-                        account_delta += greeks['delta']
-                        account_gamma += greeks['gamma']
-                        account_theta += greeks['theta']
-                        account_vega += greeks['vega']
-                        
-                        account_pnl += p.current_pnl
-                    except Exception as e:
-                        logger.error(f"Error calculating account metrics for position {p.id}: {e}", exc_info=True)
+                    underlying_symbol = position_underlyings.get(p.id)
+                    if underlying_symbol:
+                        account_underlyings[underlying_symbol] += 1
                 
                 logger.debug(f"Account {account.name}: {len(account_positions)} positions, open=${account_premium_open:.2f}, cost_basis=${account_cost_basis:.2f}, notional=${account_notional_risk:.2f}, Δ{account_delta:.2f}")
                 
@@ -1236,17 +1434,9 @@ def risk():
 # ANALYTICS HELPER FUNCTIONS
 ###############################################################################
 
-def is_market_closed(check_date):
-    """Check if market is closed (weekend or US stock market holiday)"""
-    from datetime import date
-    
-    # Check weekend
-    weekday = check_date.weekday()
-    if weekday >= 5:  # Saturday = 5, Sunday = 6
-        return True
-    
-    # US Stock Market Holidays for 2025
-    holidays_2025 = [
+# US stock market holidays, keyed by year
+MARKET_HOLIDAYS = {
+    2025: frozenset([
         date(2025, 1, 1),   # New Year's Day
         date(2025, 1, 20),  # MLK Day
         date(2025, 2, 17),  # Presidents' Day
@@ -1257,169 +1447,494 @@ def is_market_closed(check_date):
         date(2025, 9, 1),   # Labor Day
         date(2025, 11, 27), # Thanksgiving
         date(2025, 12, 25), # Christmas
-    ]
-    
-    return check_date in holidays_2025
+    ]),
+    2026: frozenset([
+        date(2026, 1, 1),   # New Year's Day
+        date(2026, 1, 19),  # MLK Day
+        date(2026, 2, 16),  # Presidents' Day
+        date(2026, 4, 3),   # Good Friday
+        date(2026, 5, 25),  # Memorial Day
+        date(2026, 6, 19),  # Juneteenth
+        date(2026, 7, 3),   # Independence Day (observed)
+        date(2026, 9, 7),   # Labor Day
+        date(2026, 11, 26), # Thanksgiving
+        date(2026, 12, 25), # Christmas
+    ]),
+}
+
+@lru_cache(maxsize=4096)
+def is_market_closed(check_date):
+    """Check if market is closed (weekend or US stock market holiday)"""
+    # Saturday = 5, Sunday = 6
+    return check_date.weekday() >= 5 or check_date in MARKET_HOLIDAYS.get(check_date.year, ())
+
+def _build_trading_calendar():
+    """Return every trading day in the years covered by MARKET_HOLIDAYS, sorted"""
+    trading_days = []
+    for year in sorted(MARKET_HOLIDAYS):
+        day = date(year, 1, 1)
+        while day.year == year:
+            if not is_market_closed(day):
+                trading_days.append(day)
+            day += timedelta(days=1)
+    return tuple(trading_days)
 
+# Trading-day schedule built once at import (the holiday years are contiguous)
+TRADING_CALENDAR = _build_trading_calendar()
+
+@lru_cache(maxsize=1024)
 def get_next_trading_day(start_date):
     """Get the next trading day after start_date"""
-    from datetime import timedelta
+    if start_date.year in MARKET_HOLIDAYS:
+        index = bisect_right(TRADING_CALENDAR, start_date)
+        if index < len(TRADING_CALENDAR):
+            return TRADING_CALENDAR[index]
+    
+    # Outside the calendar: walk forward day by day
     next_day = start_date + timedelta(days=1)
     while is_market_closed(next_day):
         next_day += timedelta(days=1)
     return next_day
 
-###############################################################################
-# ANALYTICS ROUTES
-###############################################################################
+@lru_cache(maxsize=8192)
+def parse_strike_key(strike_key):
+    """Return the strike of an option chain strike key, e.g. '5900.0' -> 5900.0.
 
-@app.route('/analytics')
-@login_required
-def analytics():
-    """Main analytics page with Greek exposure analysis"""
-    return render_template('analytics/analytics.html')
+    Chains repeat the same few hundred keys in every map and on every request,
+    so the parsed values are memoized.
+    """
+    return float(strike_key.partition(':')[0])
 
+# Strike-sorted index per expiration strike map, keyed on the map's id. Cached
+# chains hand the same parsed maps to every request until the chain changes,
+# so the sort is done once per map. Each entry holds its map, which keeps the
+# id from being reused while the entry is alive.
+STRIKE_INDEX_MEMO_SIZE = 64
+_strike_index_memo = OrderedDict()
 
-@app.route('/analytics/gex', methods=['POST'])
-@login_required
-def analytics_gex():
-    """Calculate Gamma Exposure (GEX) for a given ticker"""
-    print("=" * 50)
-    print("ANALYTICS GEX ENDPOINT CALLED")
-    print("=" * 50)
-    try:
-        from datetime import date
-        
-        data = request.get_json()
-        print(f"Received data: {data}")
-        ticker = data.get('ticker', 'SPX').upper()
-        detail = data.get('detail', False)
-        show_all = data.get('show_all', False)
-        strike_range = data.get('strike_range')
-        print(f"Ticker: {ticker}, Detail: {detail}, Show All: {show_all}, Strike Range: {strike_range}")
-        
-        # Check if market is closed and determine target date
-        today = date.today()
-        if is_market_closed(today):
-            target_date = get_next_trading_day(today)
-            print(f"Market is CLOSED today ({today.strftime('%A, %Y-%m-%d')})")
-            print(f"Using next trading day: {target_date.strftime('%A, %Y-%m-%d')}")
-        else:
-            target_date = today
-            print(f"Market is OPEN today ({today.strftime('%A, %Y-%m-%d')})")
-        
-        # Initialize Schwab client
-        import schwab
-        token_path = '/app/token.json'
-        if not os.path.exists(token_path):
-            app_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-            token_path = os.path.join(app_root, 'token.json')
-        
-        schwab_client = schwab.auth.client_from_token_file(
-            token_path,
-            api_key=os.environ.get('SCHWAB_API_KEY'),
-            app_secret=os.environ.get('SCHWAB_APP_SECRET'),
-            enforce_enums=False
-        )
-        
-        # Fetch option chains with target date
-        symbols_to_try = [f'${ticker}.X', ticker, f'${ticker}']
-        chain_response = None
-        
-        for symbol in symbols_to_try:
-            print(f"Trying symbol: {symbol} for date {target_date}")
+def _sorted_strike_index(strikes):
+    """Return (strikes, keys) ordered by strike for one expiration's strike map"""
+    entry = _strike_index_memo.get(id(strikes))
+    if entry is not None and entry[0] is strikes:
+        return entry[1]
+    pairs = sorted((parse_strike_key(strike_key), strike_key) for strike_key in strikes)
+    index = tuple(pair[0] for pair in pairs), tuple(pair[1] for pair in pairs)
+    _remember_latest(_strike_index_memo, id(strikes), (strikes, index), STRIKE_INDEX_MEMO_SIZE)
+    return index
+
+def _strikes_in_window(strikes, strike_min, strike_max):
+    """Yield (strike, options) in strike order for one expiration's strikes
+    within [strike_min, strike_max].
+
+    For a strike map already indexed, only the strikes inside the window are
+    visited, found by bisecting its strike-sorted keys.
+    """
+    sorted_strikes, sorted_keys = _sorted_strike_index(strikes)
+    lo = bisect_left(sorted_strikes, strike_min)
+    hi = bisect_right(sorted_strikes, strike_max)
+    for strike, strike_key in zip(sorted_strikes[lo:hi], sorted_keys[lo:hi]):
+        yield strike, strikes[strike_key]
+
+def _window_strikes(exp_map, strike_min, strike_max, show_all=False):
+    """Yield (strike, options) for each strike of an expiration map in the window.
+
+    Only the nearest expiration is used unless show_all is set. Strikes outside
+    [strike_min, strike_max] are skipped.
+    """
+    if not show_all and exp_map:
+        # Walk the nearest expiration's strikes directly; the rest are never touched
+        strike_maps = (exp_map[min(exp_map)],)
+    else:
+        strike_maps = exp_map.values()
+    
+    for strikes in strike_maps:
+        yield from _strikes_in_window(strikes, strike_min, strike_max)
+
+def _walk_exp_map(exp_map, greek_key, strike_min, strike_max, show_all=False):
+    """Yield (strike, sum of greek × volume) for each strike of an expiration map.
+
+    Strikes whose options all lack the greek or volume are skipped; see
+    _window_strikes for which strikes are visited.
+    """
+    greek_and_volume = itemgetter(greek_key, 'totalVolume')
+    for strike, options in _window_strikes(exp_map, strike_min, strike_max, show_all):
+        strike_total = 0
+        has_exposure = False
+        for option in options:
             try:
-                chain_response = schwab_client.get_option_chain(
-                    symbol=symbol,
-                    from_date=target_date,
-                    to_date=target_date
-                )
-                if chain_response.status_code == 200:
-                    print(f"Success with symbol: {symbol}")
-                    break
-            except Exception as e:
-                print(f"Failed with symbol {symbol}: {e}")
+                greek, volume = greek_and_volume(option)
+            except KeyError:
+                greek, volume = option.get(greek_key), option.get('totalVolume')
+            # Options without the greek or without volume contribute nothing
+            if not greek or not volume:
                 continue
+            strike_total += greek * volume
+            has_exposure = True
         
-        if not chain_response or chain_response.status_code != 200:
-            return jsonify({'error': 'Failed to fetch option chain'}), 400
-        
-        chain_data = chain_response.json()
-        
-        if chain_data.get('status') == 'FAILED':
-            return jsonify({'error': 'Failed to fetch option chain'}), 400
-        
-        # Get underlying price
-        spot_price = chain_data.get('underlyingPrice', 0)
+        if has_exposure:
+            yield strike, strike_total
+
+def sum_call_put_exposure(chain_data, greek_key, call_multiplier, put_multiplier,
+                          strike_min, strike_max, show_all=False):
+    """Per-strike call and put exposure for one greek of an option chain.
+
+    Exposure is greek × volume × the side's multiplier, summed per strike.
+    Returns {strike: {'call': x, 'put': y}}, built in a single dict.
+    """
+    exposure_by_strike = defaultdict(lambda: {'call': 0, 'put': 0})
+    # The two sides are walked serially on purpose: the walk is pure Python and
+    # holds the GIL, so splitting it across threads would only add overhead
+    for side, exp_map_key, multiplier in (('call', 'callExpDateMap', call_multiplier),
+                                          ('put', 'putExpDateMap', put_multiplier)):
+        for strike, strike_total in _walk_exp_map(chain_data.get(exp_map_key, {}), greek_key,
+                                                  strike_min, strike_max, show_all):
+            exposure_by_strike[strike][side] += strike_total * multiplier
+    return exposure_by_strike
+
+# Chain options carry every greek, so the four fields are read in one call
+_option_exposure_fields = itemgetter('totalVolume', 'gamma', 'vega', 'delta')
+
+def accumulate_greek_exposures(exp_map, strike_min, strike_max, spot_price, dte,
+                               gex_sign=1, peaks=None, gex_by_strike=None):
+    """Sum GEX, VEX, DEX and CHEX over the nearest expiration of one chain side.
+
+    GEX is multiplied by gex_sign (-1 for puts). Returns (totals, volume) where
+    totals is {'gex', 'vex', 'dex', 'chex'}. When a peaks dict of
+    {greek: {'strike', 'value'}} is given, it is updated in place with the
+    option carrying the largest absolute exposure for each greek. When a
+    gex_by_strike mapping is given, each strike's GEX is added to it in the
+    same pass.
+    """
+    total_gex = total_vex = total_dex = total_chex = 0
+    total_volume = 0
+    gex_multiplier = gex_sign * 100 * (spot_price ** 2)
+    dex_multiplier = 100 * spot_price
+    
+    for strike, options in _window_strikes(exp_map, strike_min, strike_max):
+        for option in options:
+            try:
+                volume, gamma, vega, delta = _option_exposure_fields(option)
+            except KeyError:
+                volume, gamma, vega, delta = map(option.get, ('totalVolume', 'gamma', 'vega', 'delta'))
+            if not volume:
+                continue
+            total_volume += volume
+            
+            gex = gamma * volume * gex_multiplier if gamma else 0
+            if gamma and gex_by_strike is not None:
+                gex_by_strike[strike] += gex
+            vex = vega * volume * 100 if vega else 0
+            dex = delta * volume * dex_multiplier if delta else 0
+            chex = dex / dte if delta and dte else 0
+            total_gex += gex
+            total_vex += vex
+            total_dex += dex
+            total_chex += chex
+            
+            if peaks is not None:
+                for greek, value in (('gex', gex), ('vex', vex), ('dex', dex), ('chex', chex)):
+                    if abs(value) > abs(peaks[greek]['value']):
+                        peaks[greek] = {'strike': strike, 'value': value}
+    
+    totals = {'gex': total_gex, 'vex': total_vex, 'dex': total_dex, 'chex': total_chex}
+    return totals, total_volume
+
+# One strike's net exposure on a GEX/VEX/DEX/CHEX chart; converted to a dict
+# only when the response is built
+ChartPoint = namedtuple('ChartPoint', 'strike exposure')
+
+def build_gex_interpretation(spot_price, zero_gex_strike, resistance, support, total_gex):
+    """Return the GEX interpretation lines for the analytics page.
+
+    resistance and support are ChartPoints with strike 0 when
+    there is no level; zero_gex_strike is None without a flip point. Each
+    value is formatted once and reused across the lines that mention it.
+    """
+    interpretation = []
+    spot_s = f"${spot_price:.0f}"
+    has_flip = bool(zero_gex_strike)
+    has_range = resistance.strike > 0 and support.strike > 0
+    positive_regime = has_flip and spot_price > zero_gex_strike
+    flip_s = f"${zero_gex_strike:.0f}" if has_flip else None
+    res_s = f"${resistance.strike:.0f}"
+    sup_s = f"${support.strike:.0f}"
+    
+    # 1. Basic GEX Levels
+    if has_flip:
+        interpretation.append(f"🎯 Zero GEX flip point at {flip_s}")
+    
+    if resistance.strike > 0:
+        gex_sign = "positive" if resistance.exposure > 0 else "negative"
+        interpretation.append(f"📈 Key resistance level at {res_s} (${abs(resistance.exposure)/1e9:.2f}B {gex_sign} GEX)")
+    
+    if support.strike > 0:
+        gex_sign = "positive" if support.exposure > 0 else "negative"
+        interpretation.append(f"📉 Key support level at {sup_s} (${abs(support.exposure)/1e9:.2f}B {gex_sign} GEX)")
+    
+    # 2. Market Regime Context
+    if has_flip:
+        if positive_regime:
+            interpretation.append(f"✅ POSITIVE GAMMA REGIME: Spot ({spot_s}) is above flip point ({flip_s})")
+            interpretation.append("Market makers are long gamma — their hedging dampens volatility (sell rallies, buy dips)")
+            interpretation.append(f"⚠️ If spot breaks below {flip_s}, market transitions to negative gamma with expanding volatility")
+        else:
+            interpretation.append(f"⚠️ NEGATIVE GAMMA REGIME: Spot ({spot_s}) is below flip point ({flip_s})")
+            interpretation.append("Market makers are short gamma — their hedging amplifies volatility (sell dips, buy rallies)")
+            interpretation.append(f"📈 If spot breaks above {flip_s}, volatility may compress in positive gamma zone")
+    
+    if has_range:
+        lower_bound = min(resistance.strike, support.strike)
+        upper_bound = max(resistance.strike, support.strike)
+        range_s = f"${lower_bound:.0f}–${upper_bound:.0f}"
+        range_width = upper_bound - lower_bound
         
-        # Calculate strike range
-        if strike_range:
-            strike_min = spot_price - float(strike_range)
-            strike_max = spot_price + float(strike_range)
-        elif detail:
-            # Detail mode: ±15%
-            strike_min = spot_price * 0.85
-            strike_max = spot_price * 1.15
+        # 3. Expected Volatility and Range
+        interpretation.append(f"📊 Expected intraday range: {range_s} ({range_width:.0f} pts)")
+        if range_width < 100:
+            interpretation.append(f"🔒 Narrow range ({range_width:.0f} pts) implies compressed volatility and mean-reversion bias")
         else:
-            # Default: ±50 points
-            strike_min = spot_price - 50
-            strike_max = spot_price + 50
+            interpretation.append(f"📏 Wide range ({range_width:.0f} pts) allows for directional movement")
         
-        # Process option chain and calculate GEX
-        gex_data = {}
-        expiration_map = chain_data.get('callExpDateMap', {})
+        # 4. Liquidity and Pinning Zones
+        if abs(spot_price - resistance.strike) < 30:
+            interpretation.append(f"📍 Price near resistance ({res_s}) — watch for pinning effects and upside caps")
+        elif abs(spot_price - support.strike) < 30:
+            interpretation.append(f"📍 Price near support ({sup_s}) — watch for pinning effects and downside protection")
+        else:
+            interpretation.append("🎯 Price between support/resistance — high dealer gamma exposure creates liquidity magnets at extremes")
+    
+    # 5. Trading Implications
+    interpretation.append("💡 TRADING IMPLICATIONS:")
+    
+    if positive_regime:
+        if resistance.strike > 0 and abs(spot_price - resistance.strike) < 50:
+            interpretation.append(f"• Directional Bias: Neutral-to-slightly bearish (capped by resistance at {res_s})")
+        else:
+            interpretation.append("• Directional Bias: Neutral (positive gamma supports mean reversion)")
+        
+        interpretation.append("• Volatility Bias: Expect low realized volatility unless walls are breached")
+        interpretation.append("• Strategy: Favor mean-reversion trades (iron condors, credit spreads)")
+        interpretation.append(f"• Risk Management: Tight stops if spot breaks below {flip_s} flip point")
+    else:
+        # Negative gamma regime or no flip point
+        interpretation.append("• Directional Bias: Higher directional risk in negative gamma")
+        interpretation.append("• Volatility Bias: Expect elevated realized volatility")
+        interpretation.append("• Strategy: Consider long gamma trades (buying options, straddles)")
+        interpretation.append("• Risk Management: Wider stops to accommodate volatility expansion")
+    
+    # 6. Summary
+    if not (has_range and has_flip):
+        return interpretation
+    
+    if positive_regime:
+        summary = "📋 SUMMARY: Positive gamma regime with controlled volatility. "
+    else:
+        summary = "📋 SUMMARY: Negative gamma regime with elevated volatility. "
+    summary += f"Price expected to gravitate between {range_s}. "
+    if total_gex > 0:
+        summary += f"Net positive GEX (${total_gex/1e9:.2f}B) suggests downside support."
+    elif total_gex < 0:
+        summary += f"Net negative GEX (${total_gex/1e9:.2f}B) suggests upside resistance."
+    interpretation.append(summary)
+    return interpretation
+
+# Option chain symbol form that last worked per ticker, e.g. SPX -> $SPX.X
+_option_chain_symbols = {}
+
+def _request_option_chain(schwab_client, symbol, target_date):
+    """Request one day's option chain for symbol; None if the call raised"""
+    try:
+        return schwab_client.get_option_chain(
+            symbol=symbol,
+            from_date=target_date,
+            to_date=target_date
+        )
+    except Exception as e:
+        print(f"Failed with symbol {symbol}: {e}")
+        return None
+
+def _fetch_option_chain(schwab_client, ticker, target_date):
+    """Fetch one day's option chain for ticker; returns the 200 response or None.
+
+    Schwab wants a different symbol form depending on the underlying ($SPX.X,
+    SPX, $SPX). The form that last worked for the ticker is tried alone first;
+    otherwise all forms are requested concurrently and the first successful
+    one, in preference order, is used and remembered.
+    """
+    known_symbol = _option_chain_symbols.get(ticker)
+    if known_symbol:
+        response = _request_option_chain(schwab_client, known_symbol, target_date)
+        if response is not None and response.status_code == 200:
+            return response
+    
+    symbols_to_try = [f'${ticker}.X', ticker, f'${ticker}']
+    futures = [_io_executor.submit(_request_option_chain, schwab_client, symbol, target_date)
+               for symbol in symbols_to_try]
+    for symbol, future in zip(symbols_to_try, futures):
+        response = future.result()
+        if response is not None and response.status_code == 200:
+            print(f"Success with symbol: {symbol}")
+            _option_chain_symbols[ticker] = symbol
+            for pending in futures:
+                pending.cancel()
+            return response
+    return None
+
+# Option chains are shared by the GEX/VEX/DEX tabs. They move constantly during
+# regular hours but not at all once the market is closed. Tickers come from
+# the request and chains run to megabytes, so the number kept is capped.
+OPTION_CHAIN_CACHE_TTL_SECONDS = int(os.getenv('OPTION_CHAIN_CACHE_TTL', 30))
+OPTION_CHAIN_CLOSED_CACHE_TTL_SECONDS = int(os.getenv('OPTION_CHAIN_CLOSED_CACHE_TTL', 600))
+OPTION_CHAIN_CACHE_MAX_ENTRIES = int(os.getenv('OPTION_CHAIN_CACHE_MAX_ENTRIES', 64))
+_option_chain_cache = TTLCache(maxsize=OPTION_CHAIN_CACHE_MAX_ENTRIES)
+
+# Last parsed chain per ticker as (target_date, payload digest, chain_data),
+# for the most recently fetched OPTION_CHAIN_CACHE_MAX_ENTRIES tickers
+_option_chain_payloads = OrderedDict()
+
+def get_option_chain_data(ticker, target_date):
+    """Return the parsed option chain for ticker on target_date, or None on failure.
+
+    Cached per (ticker, date) so switching between analytics tabs reuses
+    one fetch instead of pulling the same chain from Schwab each time.
+    """
+    now = datetime.now(EASTERN_TZ)
+    if not is_market_closed(now.date()) and MARKET_OPEN_TIME <= now.time() <= MARKET_CLOSE_TIME:
+        ttl_seconds = OPTION_CHAIN_CACHE_TTL_SECONDS
+    else:
+        ttl_seconds = OPTION_CHAIN_CLOSED_CACHE_TTL_SECONDS
+    
+    def fetch():
+        chain_response = _fetch_option_chain(get_schwab_client(), ticker, target_date)
+        if chain_response is None:
+            return None
         
-        # Get first expiration if not show_all
-        if not show_all and expiration_map:
-            first_exp = sorted(expiration_map.keys())[0]
-            expiration_map = {first_exp: expiration_map[first_exp]}
+        # Outside regular hours a refetch usually returns the same bytes; reuse
+        # the chain parsed last time instead of parsing it again
+        content = chain_response.content
+        digest = hashlib.blake2b(content, digest_size=16).digest()
+        previous = _option_chain_payloads.get(ticker)
+        if previous is not None and previous[:2] == (target_date, digest):
+            return previous[2]
+        
+        # Chains run to megabytes for SPX; orjson parses them several times faster
+        chain_data = orjson.loads(content) if orjson is not None else json.loads(content)
+        _remember_latest(_option_chain_payloads, ticker, (target_date, digest, chain_data),
+                         OPTION_CHAIN_CACHE_MAX_ENTRIES)
+        return chain_data
+    
+    return _option_chain_cache.get_or_fetch(
+        f'{ticker}:{target_date.isoformat()}', ttl_seconds, fetch,
+        lambda data: data is not None and data.get('status') != 'FAILED'
+    )
+
+class ChainFetchError(Exception):
+    """Raised when the option chain for an analytics request cannot be fetched"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def _fetch_chain_for_request(data):
+    """Fetch the option chain an analytics request body asks for.
+
+    Uses the next trading day while the market is closed. Returns
+    (chain_data, spot_price, dte, expiration, ticker), where expiration is the
+    nearest expiration date ('N/A' without calls). Raises ChainFetchError.
+    """
+    ticker = data.get('ticker', 'SPX').upper()
+    
+    # Check if market is closed and determine target date
+    today = date.today()
+    if is_market_closed(today):
+        target_date = get_next_trading_day(today)
+        print(f"{ticker}: Market CLOSED, using {target_date.strftime('%A, %Y-%m-%d')}")
+    else:
+        target_date = today
+    
+    # Fetch option chain for the target date (shared short-lived cache)
+    chain_data = get_option_chain_data(ticker, target_date)
+    
+    if not chain_data or chain_data.get('status') == 'FAILED':
+        raise ChainFetchError('Failed to fetch option chain')
+    
+    exp_date_str = min(chain_data['callExpDateMap']) if chain_data.get('callExpDateMap') else 'N/A'
+    return (
+        chain_data,
+        chain_data.get('underlyingPrice', 0),
+        chain_data.get('daysToExpiration', 0),
+        exp_date_str.split(':')[0],
+        ticker,
+    )
+
+def strike_window(spot_price, strike_range=None, detail=False):
+    """Return (strike_min, strike_max) around spot for an analytics request.
+
+    An explicit strike_range is ± that many points; detail mode is ±15%;
+    the default is ±50 points.
+    """
+    if strike_range:
+        return spot_price - float(strike_range), spot_price + float(strike_range)
+    if detail:
+        return spot_price * 0.85, spot_price * 1.15
+    return spot_price - 50, spot_price + 50
+
+def _whole_dollar_points(points):
+    """Convert ChartPoints to {'strike', 'exposure'} dicts, exposure in whole dollars"""
+    return [{'strike': p.strike, 'exposure': round(p.exposure)} for p in points]
+
+def exposure_response(ticker, spot_price, expiration, dte, total_exposure, chart_data, key_levels, interpretation):
+    """jsonify the payload shared by the GEX/VEX/DEX/CHEX endpoints.
+
+    Exposures are sent as whole dollars: the page shows them in millions or
+    billions, and dropping the fractional digits roughly halves the size of
+    each number on the wire.
+    """
+    return jsonify({
+        'ticker': ticker,
+        'spot_price': spot_price,
+        'expiration': expiration,
+        'dte': dte,
+        'total_exposure': round(total_exposure),
+        'chart_data': _whole_dollar_points(chart_data),
+        'key_levels': _whole_dollar_points(key_levels),
+        # One newline-separated string is cheaper to encode than a list of lines
+        'interpretation': "\n".join(interpretation)
+    })
+
+###############################################################################
+# ANALYTICS ROUTES
+###############################################################################
+
+@app.route('/analytics')
+@login_required
+def analytics():
+    """Main analytics page with Greek exposure analysis"""
+    return render_template('analytics/analytics.html')
+
+
+@app.route('/analytics/gex', methods=['POST'])
+@login_required
+def analytics_gex():
+    """Calculate Gamma Exposure (GEX) for a given ticker"""
+    print("=" * 50)
+    print("ANALYTICS GEX ENDPOINT CALLED")
+    print("=" * 50)
+    try:
+        data = request.get_json()
+        print(f"Received data: {data}")
+        chain_data, spot_price, dte, expiration, ticker = _fetch_chain_for_request(data)
+        show_all = data.get('show_all', False)
+        strike_min, strike_max = strike_window(spot_price, data.get('strike_range'), data.get('detail', False))
         
-        for exp_date, strikes in expiration_map.items():
-            for strike_key, options in strikes.items():
-                strike = float(strike_key.split(':')[0])
-                
-                if strike < strike_min or strike > strike_max:
-                    continue
-                
-                for option in options:
-                    gamma = option.get('gamma', 0)
-                    volume = option.get('totalVolume', 0)
-                    
-                    if gamma and volume:
-                        # GEX formula: gamma × volume × 100 × spot²
-                        gex = gamma * volume * 100 * (spot_price ** 2)
-                        
-                        if strike not in gex_data:
-                            gex_data[strike] = {'call': 0, 'put': 0}
-                        gex_data[strike]['call'] += gex
-        
-        # Process puts
-        put_exp_map = chain_data.get('putExpDateMap', {})
-        if not show_all and put_exp_map:
-            first_exp = sorted(put_exp_map.keys())[0]
-            put_exp_map = {first_exp: put_exp_map[first_exp]}
-        
-        for exp_date, strikes in put_exp_map.items():
-            for strike_key, options in strikes.items():
-                strike = float(strike_key.split(':')[0])
-                
-                if strike < strike_min or strike > strike_max:
-                    continue
-                
-                for option in options:
-                    gamma = option.get('gamma', 0)
-                    volume = option.get('totalVolume', 0)
-                    
-                    if gamma and volume:
-                        # GEX formula: gamma × volume × 100 × spot² (negative for puts)
-                        gex = -1 * gamma * volume * 100 * (spot_price ** 2)
-                        
-                        if strike not in gex_data:
-                            gex_data[strike] = {'call': 0, 'put': 0}
-                        gex_data[strike]['put'] += gex
+        # Process option chain and calculate GEX
+        # GEX formula: gamma × volume × 100 × spot² (negative for puts)
+        gex_multiplier = 100.0 * spot_price * spot_price
+        gex_data = sum_call_put_exposure(chain_data, 'gamma', gex_multiplier, -gex_multiplier,
+                                         strike_min, strike_max, show_all)
         
-        # Sort and limit to top 50 strikes
-        sorted_strikes = sorted(gex_data.items(), key=lambda x: abs(x[1]['call'] + x[1]['put']), reverse=True)[:50]
+        # Keep the top 50 strikes by absolute exposure (partial heap, no full sort)
+        sorted_strikes = heapq.nlargest(50, gex_data.items(), key=lambda x: abs(x[1]['call'] + x[1]['put']))
         
         # Build chart data and identify key strikes
         chart_data = []
@@ -1430,147 +1945,56 @@ def analytics_gex():
         for strike, exposure in sorted_strikes:
             net_gex = exposure['call'] + exposure['put']
             total_gex += net_gex
-            chart_data.append({
-                'strike': strike,
-                'exposure': net_gex
-            })
+            chart_data.append(ChartPoint(strike, net_gex))
             
             # Separate strikes above and below spot for proper identification
             if strike > spot_price:
-                strikes_above_spot.append({'strike': strike, 'exposure': net_gex})
+                strikes_above_spot.append(ChartPoint(strike, net_gex))
             elif strike < spot_price:
-                strikes_below_spot.append({'strike': strike, 'exposure': net_gex})
+                strikes_below_spot.append(ChartPoint(strike, net_gex))
         
         # Find resistance: Strike ABOVE spot with highest absolute GEX (typically positive)
-        max_resistance_strike = {'strike': 0, 'exposure': 0}
+        max_resistance_strike = ChartPoint(0, 0)
         if strikes_above_spot:
-            max_resistance_strike = max(strikes_above_spot, key=lambda x: abs(x['exposure']))
+            max_resistance_strike = max(strikes_above_spot, key=lambda x: abs(x.exposure))
         
         # Find support: Strike BELOW spot with highest absolute GEX (typically negative)
-        max_support_strike = {'strike': 0, 'exposure': 0}
+        max_support_strike = ChartPoint(0, 0)
         if strikes_below_spot:
-            max_support_strike = max(strikes_below_spot, key=lambda x: abs(x['exposure']))
+            max_support_strike = max(strikes_below_spot, key=lambda x: abs(x.exposure))
         
         # Sort chart data by strike
-        chart_data.sort(key=lambda x: x['strike'])
+        chart_data.sort(key=lambda x: x.strike)
         
-        # Find zero GEX (flip point)
+        # Find zero GEX (flip point: first negative-to-positive step) and split
+        # strikes by sign for the key levels, in one pass over the sorted data
         zero_gex_strike = None
-        for i in range(len(chart_data) - 1):
-            if chart_data[i]['exposure'] < 0 and chart_data[i+1]['exposure'] > 0:
-                zero_gex_strike = (chart_data[i]['strike'] + chart_data[i+1]['strike']) / 2
-                break
+        positive_levels = []
+        negative_levels = []
+        previous = None
+        for d in chart_data:
+            if d.exposure > 0:
+                positive_levels.append(d)
+                if zero_gex_strike is None and previous is not None and previous.exposure < 0:
+                    zero_gex_strike = (previous.strike + d.strike) / 2
+            elif d.exposure < 0:
+                negative_levels.append(d)
+            previous = d
         
         # Key levels (top 3 resistance and support)
-        positive_levels = [{'strike': d['strike'], 'exposure': d['exposure']} 
-                          for d in chart_data if d['exposure'] > 0]
-        negative_levels = [{'strike': d['strike'], 'exposure': d['exposure']} 
-                          for d in chart_data if d['exposure'] < 0]
-        
-        positive_levels.sort(key=lambda x: x['exposure'], reverse=True)
-        negative_levels.sort(key=lambda x: abs(x['exposure']), reverse=True)
-        
-        key_levels = positive_levels[:3] + negative_levels[:3]
+        key_levels = (heapq.nlargest(3, positive_levels, key=attrgetter('exposure')) +
+                      heapq.nlargest(3, negative_levels, key=lambda x: abs(x.exposure)))
         
         # Enhanced Market interpretation
-        interpretation = []
-        
-        # 1. Basic GEX Levels
-        if zero_gex_strike:
-            interpretation.append(f"🎯 Zero GEX flip point at ${zero_gex_strike:.0f}")
-        
-        if max_resistance_strike['strike'] > 0:
-            gex_sign = "positive" if max_resistance_strike['exposure'] > 0 else "negative"
-            interpretation.append(f"📈 Key resistance level at ${max_resistance_strike['strike']:.0f} (${abs(max_resistance_strike['exposure'])/1e9:.2f}B {gex_sign} GEX)")
-        
-        if max_support_strike['strike'] > 0:
-            gex_sign = "positive" if max_support_strike['exposure'] > 0 else "negative"
-            interpretation.append(f"📉 Key support level at ${max_support_strike['strike']:.0f} (${abs(max_support_strike['exposure'])/1e9:.2f}B {gex_sign} GEX)")
-        # 2. Market Regime Context
-        if zero_gex_strike:
-            if spot_price > zero_gex_strike:
-                interpretation.append(f"✅ POSITIVE GAMMA REGIME: Spot (${spot_price:.0f}) is above flip point (${zero_gex_strike:.0f})")
-                interpretation.append("Market makers are long gamma — their hedging dampens volatility (sell rallies, buy dips)")
-                interpretation.append(f"⚠️ If spot breaks below ${zero_gex_strike:.0f}, market transitions to negative gamma with expanding volatility")
-            else:
-                interpretation.append(f"⚠️ NEGATIVE GAMMA REGIME: Spot (${spot_price:.0f}) is below flip point (${zero_gex_strike:.0f})")
-                interpretation.append("Market makers are short gamma — their hedging amplifies volatility (sell dips, buy rallies)")
-                interpretation.append(f"📈 If spot breaks above ${zero_gex_strike:.0f}, volatility may compress in positive gamma zone")
-        
-        # 3. Expected Volatility and Range
-        if max_resistance_strike['strike'] > 0 and max_support_strike['strike'] > 0:
-            range_width = abs(max_resistance_strike['strike'] - max_support_strike['strike'])
-            upper_bound = max(max_resistance_strike['strike'], max_support_strike['strike'])
-            lower_bound = min(max_resistance_strike['strike'], max_support_strike['strike'])
-            
-            interpretation.append(f"📊 Expected intraday range: ${lower_bound:.0f}–${upper_bound:.0f} ({range_width:.0f} pts)")
-            
-            if range_width < 100:
-                interpretation.append(f"🔒 Narrow range ({range_width:.0f} pts) implies compressed volatility and mean-reversion bias")
-            else:
-                interpretation.append(f"📏 Wide range ({range_width:.0f} pts) allows for directional movement")
-        
-        # 4. Liquidity and Pinning Zones
-        if max_resistance_strike['strike'] > 0 and max_support_strike['strike'] > 0:
-            if abs(spot_price - max_resistance_strike['strike']) < 30:
-                interpretation.append(f"📍 Price near resistance (${max_resistance_strike['strike']:.0f}) — watch for pinning effects and upside caps")
-            elif abs(spot_price - max_support_strike['strike']) < 30:
-                interpretation.append(f"📍 Price near support (${max_support_strike['strike']:.0f}) — watch for pinning effects and downside protection")
-            else:
-                interpretation.append(f"🎯 Price between support/resistance — high dealer gamma exposure creates liquidity magnets at extremes")
-        
-        # 5. Trading Implications
-        interpretation.append("💡 TRADING IMPLICATIONS:")
-        
-        if zero_gex_strike and spot_price > zero_gex_strike:
-            # Positive gamma regime
-            if max_resistance_strike['strike'] > 0 and abs(spot_price - max_resistance_strike['strike']) < 50:
-                interpretation.append(f"• Directional Bias: Neutral-to-slightly bearish (capped by resistance at ${max_resistance_strike['strike']:.0f})")
-            else:
-                interpretation.append("• Directional Bias: Neutral (positive gamma supports mean reversion)")
-            
-            interpretation.append("• Volatility Bias: Expect low realized volatility unless walls are breached")
-            interpretation.append("• Strategy: Favor mean-reversion trades (iron condors, credit spreads)")
-            interpretation.append(f"• Risk Management: Tight stops if spot breaks below ${zero_gex_strike:.0f} flip point")
-        else:
-            # Negative gamma regime or no flip point
-            interpretation.append("• Directional Bias: Higher directional risk in negative gamma")
-            interpretation.append("• Volatility Bias: Expect elevated realized volatility")
-            interpretation.append("• Strategy: Consider long gamma trades (buying options, straddles)")
-            interpretation.append("• Risk Management: Wider stops to accommodate volatility expansion")
-        
-        # 6. Summary
-        if max_resistance_strike['strike'] > 0 and max_support_strike['strike'] > 0 and zero_gex_strike:
-            summary = f"📋 SUMMARY: "
-            if spot_price > zero_gex_strike:
-                summary += f"Positive gamma regime with controlled volatility. "
-            else:
-                summary += f"Negative gamma regime with elevated volatility. "
-            
-            summary += f"Price expected to gravitate between ${min(max_resistance_strike['strike'], max_support_strike['strike']):.0f}–${max(max_resistance_strike['strike'], max_support_strike['strike']):.0f}. "
-            
-            if total_gex > 0:
-                summary += f"Net positive GEX (${total_gex/1e9:.2f}B) suggests downside support."
-            elif total_gex < 0:
-                summary += f"Net negative GEX (${total_gex/1e9:.2f}B) suggests upside resistance."
-            
-            interpretation.append(summary)
+        interpretation = build_gex_interpretation(
+            spot_price, zero_gex_strike, max_resistance_strike, max_support_strike, total_gex
+        )
         
-        # Get expiration info
-        exp_date_str = sorted(chain_data.get('callExpDateMap', {}).keys())[0] if chain_data.get('callExpDateMap') else 'N/A'
-        dte = chain_data.get('daysToExpiration', 0)
-        
-        return jsonify({
-            'ticker': ticker,
-            'spot_price': spot_price,
-            'expiration': exp_date_str.split(':')[0] if ':' in exp_date_str else exp_date_str,
-            'dte': dte,
-            'total_exposure': total_gex,
-            'chart_data': chart_data,
-            'key_levels': key_levels,
-            'interpretation': interpretation
-        })
+        return exposure_response(ticker, spot_price, expiration, dte, total_gex,
+                                 chart_data, key_levels, interpretation)
         
+    except ChainFetchError as e:
+        return jsonify({'error': e.message}), e.status
     except Exception as e:
         import traceback
         print(f"Error in GEX calculation: {str(e)}")
@@ -1583,150 +2007,41 @@ def analytics_gex():
 def analytics_vex():
     """Calculate Vega Exposure (VEX) for a given ticker"""
     try:
-        from datetime import date
-        
         data = request.get_json()
-        ticker = data.get('ticker', 'SPX').upper()
-        detail = data.get('detail', False)
+        chain_data, spot_price, dte, expiration, ticker = _fetch_chain_for_request(data)
         show_all = data.get('show_all', False)
-        strike_range = data.get('strike_range')
-        
-        # Check if market is closed and determine target date
-        today = date.today()
-        if is_market_closed(today):
-            target_date = get_next_trading_day(today)
-            print(f"VEX: Market CLOSED, using {target_date.strftime('%A, %Y-%m-%d')}")
-        else:
-            target_date = today
-            print(f"VEX: Market OPEN, using {today.strftime('%A, %Y-%m-%d')}")
-        
-        # Initialize Schwab client
-        import schwab
-        token_path = '/app/token.json'
-        if not os.path.exists(token_path):
-            app_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-            token_path = os.path.join(app_root, 'token.json')
-        
-        schwab_client = schwab.auth.client_from_token_file(
-            token_path,
-            api_key=os.environ.get('SCHWAB_API_KEY'),
-            app_secret=os.environ.get('SCHWAB_APP_SECRET'),
-            enforce_enums=False
-        )
-        
-        # Fetch option chains with target date
-        symbols_to_try = [f'${ticker}.X', ticker, f'${ticker}']
-        chain_response = None
-        
-        for symbol in symbols_to_try:
-            try:
-                chain_response = schwab_client.get_option_chain(
-                    symbol=symbol,
-                    from_date=target_date,
-                    to_date=target_date
-                )
-                if chain_response.status_code == 200:
-                    break
-            except:
-                continue
-        
-        if not chain_response or chain_response.status_code != 200:
-            return jsonify({'error': 'Failed to fetch option chain'}), 400
-        
-        chain_data = chain_response.json()
-        
-        if chain_data.get('status') == 'FAILED':
-            return jsonify({'error': 'Failed to fetch option chain'}), 400
-        
-        spot_price = chain_data.get('underlyingPrice', 0)
-        
-        # Calculate strike range
-        if strike_range:
-            strike_min = spot_price - float(strike_range)
-            strike_max = spot_price + float(strike_range)
-        elif detail:
-            strike_min = spot_price * 0.85
-            strike_max = spot_price * 1.15
-        else:
-            strike_min = spot_price - 50
-            strike_max = spot_price + 50
+        strike_min, strike_max = strike_window(spot_price, data.get('strike_range'), data.get('detail', False))
         
         # Process VEX
-        vex_data = {}
-        expiration_map = chain_data.get('callExpDateMap', {})
-        
-        if not show_all and expiration_map:
-            first_exp = sorted(expiration_map.keys())[0]
-            expiration_map = {first_exp: expiration_map[first_exp]}
-        
-        for exp_date, strikes in expiration_map.items():
-            for strike_key, options in strikes.items():
-                strike = float(strike_key.split(':')[0])
-                
-                if strike < strike_min or strike > strike_max:
-                    continue
-                
-                for option in options:
-                    vega = option.get('vega', 0)
-                    volume = option.get('totalVolume', 0)
-                    
-                    if vega and volume:
-                        # VEX formula: vega × volume × 100
-                        vex = vega * volume * 100
-                        
-                        if strike not in vex_data:
-                            vex_data[strike] = 0
-                        vex_data[strike] += vex
-        
-        # Process puts
-        put_exp_map = chain_data.get('putExpDateMap', {})
-        if not show_all and put_exp_map:
-            first_exp = sorted(put_exp_map.keys())[0]
-            put_exp_map = {first_exp: put_exp_map[first_exp]}
-        
-        for exp_date, strikes in put_exp_map.items():
-            for strike_key, options in strikes.items():
-                strike = float(strike_key.split(':')[0])
-                
-                if strike < strike_min or strike > strike_max:
-                    continue
-                
-                for option in options:
-                    vega = option.get('vega', 0)
-                    volume = option.get('totalVolume', 0)
-                    
-                    if vega and volume:
-                        vex = vega * volume * 100
-                        
-                        if strike not in vex_data:
-                            vex_data[strike] = 0
-                        vex_data[strike] += vex
+        # VEX formula: vega × volume × 100, calls and puts summed per strike
+        vex_data = {
+            strike: exposure['call'] + exposure['put']
+            for strike, exposure in sum_call_put_exposure(chain_data, 'vega', 100, 100,
+                                                          strike_min, strike_max, show_all).items()
+        }
         
         # Sort and limit
-        sorted_strikes = sorted(vex_data.items(), key=lambda x: abs(x[1]), reverse=True)[:50]
+        sorted_strikes = heapq.nlargest(50, vex_data.items(), key=lambda x: abs(x[1]))
         
         chart_data = []
         total_vex = 0
         
         for strike, exposure in sorted_strikes:
             total_vex += exposure
-            chart_data.append({
-                'strike': strike,
-                'exposure': exposure
-            })
+            chart_data.append(ChartPoint(strike, exposure))
         
-        chart_data.sort(key=lambda x: x['strike'])
+        chart_data.sort(key=lambda x: x.strike)
         
         # Key levels
         key_levels = sorted(sorted_strikes, key=lambda x: abs(x[1]), reverse=True)[:5]
-        key_levels = [{'strike': k[0], 'exposure': k[1]} for k in key_levels]
+        key_levels = [ChartPoint(*k) for k in key_levels]
         
         # Enhanced VEX Interpretation
         interpretation = []
         
         # Find highest VEX strike
-        highest_vex_strike = key_levels[0]['strike'] if key_levels else None
-        highest_vex_value = key_levels[0]['exposure'] if key_levels else 0
+        highest_vex_strike = key_levels[0].strike if key_levels else None
+        highest_vex_value = key_levels[0].exposure if key_levels else 0
         
         # Calculate VEX concentration metrics
         if highest_vex_strike:
@@ -1747,7 +2062,7 @@ def analytics_vex():
             
         # Analyze VEX distribution pattern
         if len(key_levels) >= 3:
-            vex_range = max([k['strike'] for k in key_levels]) - min([k['strike'] for k in key_levels])
+            vex_range = max([k.strike for k in key_levels]) - min([k.strike for k in key_levels])
             
             interpretation.append(f"📊 VEX DISTRIBUTION:")
             if vex_range < 100:
@@ -1806,20 +2121,11 @@ def analytics_vex():
             
             interpretation.append(summary)
         
-        exp_date_str = sorted(chain_data.get('callExpDateMap', {}).keys())[0] if chain_data.get('callExpDateMap') else 'N/A'
-        dte = chain_data.get('daysToExpiration', 0)
-        
-        return jsonify({
-            'ticker': ticker,
-            'spot_price': spot_price,
-            'expiration': exp_date_str.split(':')[0] if ':' in exp_date_str else exp_date_str,
-            'dte': dte,
-            'total_exposure': total_vex,
-            'chart_data': chart_data,
-            'key_levels': key_levels,
-            'interpretation': interpretation
-        })
+        return exposure_response(ticker, spot_price, expiration, dte, total_vex,
+                                 chart_data, key_levels, interpretation)
         
+    except ChainFetchError as e:
+        return jsonify({'error': e.message}), e.status
     except Exception as e:
         import traceback
         print(f"Error in VEX calculation: {str(e)}")
@@ -1827,128 +2133,80 @@ def analytics_vex():
         return jsonify({'error': str(e)}), 500
 
 
+# Fixed DEX interpretation text for each delta bias; only the lines carrying
+# numbers are formatted per request
+DEX_HEDGING_FLOWS = {
+    'bullish': (
+        "• Dealers are SHORT delta → must BUY on dips to stay hedged",
+        "• Creates automatic dip-buying pressure (bullish feedback loop)",
+        "• Rallies may accelerate as dealers chase rising prices",
+    ),
+    'neutral-bullish': (
+        "• Dealers have modest bullish delta → mild dip-buying tendency",
+        "• Moderate support on pullbacks",
+    ),
+    'bearish': (
+        "• Dealers are LONG delta → must SELL on rallies to stay hedged",
+        "• Creates automatic rally-selling pressure (bearish feedback loop)",
+        "• Declines may accelerate as dealers chase falling prices",
+    ),
+    'neutral-bearish': (
+        "• Dealers have modest bearish delta → mild rally-selling tendency",
+        "• Moderate resistance on bounces",
+    ),
+    'neutral': (
+        "• Balanced dealer positioning → minimal directional hedging flows",
+    ),
+}
+
+DEX_TRADING_IMPLICATIONS = {
+    'bullish': (
+        "• Directional Bias: BULLISH — favor long delta strategies",
+        "• Dealers' forced buying on dips creates support",
+        "• Strategy: Buy dips, long call spreads, bull put spreads",
+        "• Risk: Bearish reversal if DEX flips negative",
+    ),
+    'neutral-bullish': (
+        "• Directional Bias: Neutral-to-Bullish",
+        "• Strategy: Sell put premium, bullish risk reversals",
+        "• Watch for DEX to strengthen or weaken",
+    ),
+    'bearish': (
+        "• Directional Bias: BEARISH — favor short delta strategies",
+        "• Dealers' forced selling on rallies creates resistance",
+        "• Strategy: Sell rallies, put spreads, bear call spreads",
+        "• Risk: Bullish reversal if DEX flips positive",
+    ),
+    'neutral-bearish': (
+        "• Directional Bias: Neutral-to-Bearish",
+        "• Strategy: Sell call premium, bearish risk reversals",
+        "• Watch for DEX to strengthen or weaken",
+    ),
+    'neutral': (
+        "• Directional Bias: NEUTRAL — no strong delta edge",
+        "• Strategy: Non-directional (iron condors, straddles)",
+    ),
+}
+
 @app.route('/analytics/dex', methods=['POST'])
 @login_required
 def analytics_dex():
     """Calculate Delta Exposure (DEX) for a given ticker"""
     try:
-        from datetime import date
-        
         data = request.get_json()
-        ticker = data.get('ticker', 'SPX').upper()
-        detail = data.get('detail', False)
+        chain_data, spot_price, dte, expiration, ticker = _fetch_chain_for_request(data)
         show_all = data.get('show_all', False)
-        strike_range = data.get('strike_range')
-        
-        # Check if market is closed
-        today = date.today()
-        target_date = get_next_trading_day(today) if is_market_closed(today) else today
-        
-        # Initialize Schwab client
-        import schwab
-        token_path = '/app/token.json'
-        if not os.path.exists(token_path):
-            app_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-            token_path = os.path.join(app_root, 'token.json')
-        
-        schwab_client = schwab.auth.client_from_token_file(
-            token_path,
-            api_key=os.environ.get('SCHWAB_API_KEY'),
-            app_secret=os.environ.get('SCHWAB_APP_SECRET'),
-            enforce_enums=False
-        )
-        
-        # Fetch option chains with target date
-        symbols_to_try = [f'${ticker}.X', ticker, f'${ticker}']
-        chain_response = None
-        
-        for symbol in symbols_to_try:
-            try:
-                chain_response = schwab_client.get_option_chain(
-                    symbol=symbol,
-                    from_date=target_date,
-                    to_date=target_date
-                )
-                if chain_response.status_code == 200:
-                    break
-            except:
-                continue
-        
-        if not chain_response or chain_response.status_code != 200:
-            return jsonify({'error': 'Failed to fetch option chain'}), 400
-        
-        chain_data = chain_response.json()
-        
-        if chain_data.get('status') == 'FAILED':
-            return jsonify({'error': 'Failed to fetch option chain'}), 400
-        
-        spot_price = chain_data.get('underlyingPrice', 0)
-        
-        # Calculate strike range
-        if strike_range:
-            strike_min = spot_price - float(strike_range)
-            strike_max = spot_price + float(strike_range)
-        elif detail:
-            strike_min = spot_price * 0.85
-            strike_max = spot_price * 1.15
-        else:
-            strike_min = spot_price - 50
-            strike_max = spot_price + 50
+        compact = data.get('compact', False)
+        strike_min, strike_max = strike_window(spot_price, data.get('strike_range'), data.get('detail', False))
         
         # Process DEX
-        dex_data = {}
-        expiration_map = chain_data.get('callExpDateMap', {})
-        
-        if not show_all and expiration_map:
-            first_exp = sorted(expiration_map.keys())[0]
-            expiration_map = {first_exp: expiration_map[first_exp]}
-        
-        for exp_date, strikes in expiration_map.items():
-            for strike_key, options in strikes.items():
-                strike = float(strike_key.split(':')[0])
-                
-                if strike < strike_min or strike > strike_max:
-                    continue
-                
-                for option in options:
-                    delta = option.get('delta', 0)
-                    volume = option.get('totalVolume', 0)
-                    
-                    if delta and volume:
-                        # DEX formula: delta × volume × 100 × spot
-                        dex = delta * volume * 100 * spot_price
-                        
-                        if strike not in dex_data:
-                            dex_data[strike] = {'call': 0, 'put': 0}
-                        dex_data[strike]['call'] += dex
-        
-        # Process puts
-        put_exp_map = chain_data.get('putExpDateMap', {})
-        if not show_all and put_exp_map:
-            first_exp = sorted(put_exp_map.keys())[0]
-            put_exp_map = {first_exp: put_exp_map[first_exp]}
-        
-        for exp_date, strikes in put_exp_map.items():
-            for strike_key, options in strikes.items():
-                strike = float(strike_key.split(':')[0])
-                
-                if strike < strike_min or strike > strike_max:
-                    continue
-                
-                for option in options:
-                    delta = option.get('delta', 0)
-                    volume = option.get('totalVolume', 0)
-                    
-                    if delta and volume:
-                        # DEX formula (puts are negative delta)
-                        dex = delta * volume * 100 * spot_price
-                        
-                        if strike not in dex_data:
-                            dex_data[strike] = {'call': 0, 'put': 0}
-                        dex_data[strike]['put'] += dex
+        # DEX formula: delta × volume × 100 × spot (puts carry negative delta)
+        dex_multiplier = 100 * spot_price
+        dex_data = sum_call_put_exposure(chain_data, 'delta', dex_multiplier, dex_multiplier,
+                                         strike_min, strike_max, show_all)
         
         # Sort and limit
-        sorted_strikes = sorted(dex_data.items(), key=lambda x: abs(x[1]['call'] + x[1]['put']), reverse=True)[:50]
+        sorted_strikes = heapq.nlargest(50, dex_data.items(), key=lambda x: abs(x[1]['call'] + x[1]['put']))
         
         chart_data = []
         total_dex = 0
@@ -1956,21 +2214,21 @@ def analytics_dex():
         for strike, exposure in sorted_strikes:
             net_dex = exposure['call'] + exposure['put']
             total_dex += net_dex
-            chart_data.append({
-                'strike': strike,
-                'exposure': net_dex
-            })
+            chart_data.append(ChartPoint(strike, net_dex))
         
-        chart_data.sort(key=lambda x: x['strike'])
+        chart_data.sort(key=lambda x: x.strike)
         
-        # Key levels
-        positive_levels = [{'strike': d['strike'], 'exposure': d['exposure']} 
-                          for d in chart_data if d['exposure'] > 0]
-        negative_levels = [{'strike': d['strike'], 'exposure': d['exposure']} 
-                          for d in chart_data if d['exposure'] < 0]
+        # Key levels: split strikes by sign in one pass, reusing the chart_data points
+        positive_levels = []
+        negative_levels = []
+        for d in chart_data:
+            if d.exposure > 0:
+                positive_levels.append(d)
+            elif d.exposure < 0:
+                negative_levels.append(d)
         
-        positive_levels.sort(key=lambda x: x['exposure'], reverse=True)
-        negative_levels.sort(key=lambda x: abs(x['exposure']), reverse=True)
+        positive_levels.sort(key=lambda x: x.exposure, reverse=True)
+        negative_levels.sort(key=lambda x: abs(x.exposure), reverse=True)
         
         key_levels = positive_levels[:3] + negative_levels[:3]
         
@@ -2006,8 +2264,8 @@ def analytics_dex():
         interpretation.append("🎯 KEY DELTA ZONES:")
         
         if positive_levels:
-            top_bull_strike = positive_levels[0]['strike']
-            top_bull_dex = positive_levels[0]['exposure']
+            top_bull_strike = positive_levels[0].strike
+            top_bull_dex = positive_levels[0].exposure
             interpretation.append(f"• Strongest bullish zone: ${top_bull_strike:.0f} (${top_bull_dex/1e9:.2f}B DEX)")
             
             if abs(spot_price - top_bull_strike) < 30:
@@ -2016,8 +2274,8 @@ def analytics_dex():
                 interpretation.append(f"  → Spot is BELOW — this level acts as upside magnet")
         
         if negative_levels:
-            top_bear_strike = negative_levels[0]['strike']
-            top_bear_dex = negative_levels[0]['exposure']
+            top_bear_strike = negative_levels[0].strike
+            top_bear_dex = negative_levels[0].exposure
             interpretation.append(f"• Strongest bearish zone: ${top_bear_strike:.0f} (${abs(top_bear_dex)/1e9:.2f}B DEX)")
             
             if abs(spot_price - top_bear_strike) < 30:
@@ -2025,66 +2283,32 @@ def analytics_dex():
             elif spot_price > top_bear_strike:
                 interpretation.append(f"  → Spot is ABOVE — this level acts as downside magnet")
         
-        # 3. Dealer Hedging Flow Implications
-        interpretation.append("🔄 DEALER HEDGING FLOWS:")
+        # Compact requests (summary cards) skip the hedging, multi-greek and
+        # trading sections and get the positioning, zones and summary only
+        if not compact:
+            # 3. Dealer Hedging Flow Implications
+            interpretation.append("🔄 DEALER HEDGING FLOWS:")
+            interpretation.extend(DEX_HEDGING_FLOWS[bias])
         
-        if total_dex > 5e9:
-            interpretation.append("• Dealers are SHORT delta → must BUY on dips to stay hedged")
-            interpretation.append("• Creates automatic dip-buying pressure (bullish feedback loop)")
-            interpretation.append("• Rallies may accelerate as dealers chase rising prices")
-        elif total_dex > 0:
-            interpretation.append("• Dealers have modest bullish delta → mild dip-buying tendency")
-            interpretation.append("• Moderate support on pullbacks")
-        elif total_dex < -5e9:
-            interpretation.append("• Dealers are LONG delta → must SELL on rallies to stay hedged")
-            interpretation.append("• Creates automatic rally-selling pressure (bearish feedback loop)")
-            interpretation.append("• Declines may accelerate as dealers chase falling prices")
-        elif total_dex < 0:
-            interpretation.append("• Dealers have modest bearish delta → mild rally-selling tendency")
-            interpretation.append("• Moderate resistance on bounces")
-        else:
-            interpretation.append("• Balanced dealer positioning → minimal directional hedging flows")
-        
-        # 4. Combined with GEX/VEX Context
-        interpretation.append("🧩 MULTI-GREEK CONTEXT:")
+            # 4. Combined with GEX/VEX Context
+            interpretation.append("🧩 MULTI-GREEK CONTEXT:")
         
-        if positive_levels and negative_levels:
-            dex_range = abs(positive_levels[0]['strike'] - negative_levels[0]['strike'])
+            if positive_levels and negative_levels:
+                dex_range = abs(positive_levels[0].strike - negative_levels[0].strike)
             
-            if total_dex > 5e9:
-                interpretation.append(f"• Bullish DEX ({net_dex_billion:.2f}B) suggests dealers will support dips")
-                interpretation.append(f"• If combined with positive GEX and high VEX near ${positive_levels[0]['strike']:.0f}:")
-                interpretation.append("  → Creates TRIPLE ANCHOR (gamma + vega + delta pinning)")
-                interpretation.append("  → Expect strong mean-reversion and dip-buying absorption")
-            elif total_dex < -5e9:
-                interpretation.append(f"• Bearish DEX ({net_dex_billion:.2f}B) suggests dealers will sell rallies")
-                interpretation.append(f"• If combined with negative GEX zone:")
-                interpretation.append("  → Amplified downside risk on breaks")
-        
-        # 5. Trading Implications
-        interpretation.append("💡 TRADING IMPLICATIONS:")
-        
-        if bias == "bullish":
-            interpretation.append("• Directional Bias: BULLISH — favor long delta strategies")
-            interpretation.append("• Dealers' forced buying on dips creates support")
-            interpretation.append("• Strategy: Buy dips, long call spreads, bull put spreads")
-            interpretation.append("• Risk: Bearish reversal if DEX flips negative")
-        elif bias == "neutral-bullish":
-            interpretation.append("• Directional Bias: Neutral-to-Bullish")
-            interpretation.append("• Strategy: Sell put premium, bullish risk reversals")
-            interpretation.append("• Watch for DEX to strengthen or weaken")
-        elif bias == "bearish":
-            interpretation.append("• Directional Bias: BEARISH — favor short delta strategies")
-            interpretation.append("• Dealers' forced selling on rallies creates resistance")
-            interpretation.append("• Strategy: Sell rallies, put spreads, bear call spreads")
-            interpretation.append("• Risk: Bullish reversal if DEX flips positive")
-        elif bias == "neutral-bearish":
-            interpretation.append("• Directional Bias: Neutral-to-Bearish")
-            interpretation.append("• Strategy: Sell call premium, bearish risk reversals")
-            interpretation.append("• Watch for DEX to strengthen or weaken")
-        else:
-            interpretation.append("• Directional Bias: NEUTRAL — no strong delta edge")
-            interpretation.append("• Strategy: Non-directional (iron condors, straddles)")
+                if total_dex > 5e9:
+                    interpretation.append(f"• Bullish DEX ({net_dex_billion:.2f}B) suggests dealers will support dips")
+                    interpretation.append(f"• If combined with positive GEX and high VEX near ${positive_levels[0].strike:.0f}:")
+                    interpretation.append("  → Creates TRIPLE ANCHOR (gamma + vega + delta pinning)")
+                    interpretation.append("  → Expect strong mean-reversion and dip-buying absorption")
+                elif total_dex < -5e9:
+                    interpretation.append(f"• Bearish DEX ({net_dex_billion:.2f}B) suggests dealers will sell rallies")
+                    interpretation.append(f"• If combined with negative GEX zone:")
+                    interpretation.append("  → Amplified downside risk on breaks")
+        
+            # 5. Trading Implications
+            interpretation.append("💡 TRADING IMPLICATIONS:")
+            interpretation.extend(DEX_TRADING_IMPLICATIONS[bias])
         
         # 6. Summary
         summary = f"📋 SUMMARY: "
@@ -2093,7 +2317,7 @@ def analytics_dex():
             summary += f"Strong bullish delta regime (${net_dex_billion:.2f}B). "
             summary += "Dealers' hedging flows will support dips and amplify rallies. "
             if positive_levels:
-                summary += f"Key support zone at ${positive_levels[0]['strike']:.0f}. "
+                summary += f"Key support zone at ${positive_levels[0].strike:.0f}. "
             summary += "Favor bullish strategies and buy dips."
         elif total_dex > 0:
             summary += f"Bullish delta bias (${net_dex_billion:.2f}B). "
@@ -2102,7 +2326,7 @@ def analytics_dex():
             summary += f"Strong bearish delta regime (${net_dex_billion:.2f}B). "
             summary += "Dealers' hedging flows will resist rallies and amplify declines. "
             if negative_levels:
-                summary += f"Key resistance zone at ${negative_levels[0]['strike']:.0f}. "
+                summary += f"Key resistance zone at ${negative_levels[0].strike:.0f}. "
             summary += "Favor bearish strategies and sell rallies."
         elif total_dex < 0:
             summary += f"Bearish delta bias (${net_dex_billion:.2f}B). "
@@ -2112,20 +2336,11 @@ def analytics_dex():
         
         interpretation.append(summary)
         
-        exp_date_str = sorted(chain_data.get('callExpDateMap', {}).keys())[0] if chain_data.get('callExpDateMap') else 'N/A'
-        dte = chain_data.get('daysToExpiration', 0)
-        
-        return jsonify({
-            'ticker': ticker,
-            'spot_price': spot_price,
-            'expiration': exp_date_str.split(':')[0] if ':' in exp_date_str else exp_date_str,
-            'dte': dte,
-            'total_exposure': total_dex,
-            'chart_data': chart_data,
-            'key_levels': key_levels,
-            'interpretation': interpretation
-        })
+        return exposure_response(ticker, spot_price, expiration, dte, total_dex,
+                                 chart_data, key_levels, interpretation)
         
+    except ChainFetchError as e:
+        return jsonify({'error': e.message}), e.status
     except Exception as e:
         import traceback
         print(f"Error in DEX calculation: {str(e)}")
@@ -2138,142 +2353,40 @@ def analytics_dex():
 def analytics_chex():
     """Calculate Charm Exposure (CHEX) for a given ticker"""
     try:
-        from datetime import date
-        
         data = request.get_json()
-        ticker = data.get('ticker', 'SPX').upper()
-        detail = data.get('detail', False)
+        chain_data, spot_price, dte, expiration, ticker = _fetch_chain_for_request(data)
         show_all = data.get('show_all', False)
-        strike_range = data.get('strike_range')
-        
-        # Check if market is closed
-        today = date.today()
-        target_date = get_next_trading_day(today) if is_market_closed(today) else today
-        
-        # Initialize Schwab client
-        import schwab
-        token_path = '/app/token.json'
-        if not os.path.exists(token_path):
-            app_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-            token_path = os.path.join(app_root, 'token.json')
-        
-        schwab_client = schwab.auth.client_from_token_file(
-            token_path,
-            api_key=os.environ.get('SCHWAB_API_KEY'),
-            app_secret=os.environ.get('SCHWAB_APP_SECRET'),
-            enforce_enums=False
-        )
-        
-        # Fetch option chains with target date
-        symbols_to_try = [f'${ticker}.X', ticker, f'${ticker}']
-        chain_response = None
-        
-        for symbol in symbols_to_try:
-            try:
-                chain_response = schwab_client.get_option_chain(
-                    symbol=symbol,
-                    from_date=target_date,
-                    to_date=target_date
-                )
-                if chain_response.status_code == 200:
-                    break
-            except:
-                continue
-        
-        if not chain_response or chain_response.status_code != 200:
-            return jsonify({'error': 'Failed to fetch option chain'}), 400
-        
-        chain_data = chain_response.json()
-        
-        if chain_data.get('status') == 'FAILED':
-            return jsonify({'error': 'Failed to fetch option chain'}), 400
-        
-        spot_price = chain_data.get('underlyingPrice', 0)
-        dte = chain_data.get('daysToExpiration', 1)  # Avoid division by zero
+        strike_min, strike_max = strike_window(spot_price, data.get('strike_range'), data.get('detail', False))
         
+        # Avoid division by zero for same-day expirations
         if dte == 0:
             dte = 1
         
-        # Calculate strike range
-        if strike_range:
-            strike_min = spot_price - float(strike_range)
-            strike_max = spot_price + float(strike_range)
-        elif detail:
-            strike_min = spot_price * 0.85
-            strike_max = spot_price * 1.15
-        else:
-            strike_min = spot_price - 50
-            strike_max = spot_price + 50
-        
         # Process CHEX
-        chex_data = {}
-        expiration_map = chain_data.get('callExpDateMap', {})
-        
-        if not show_all and expiration_map:
-            first_exp = sorted(expiration_map.keys())[0]
-            expiration_map = {first_exp: expiration_map[first_exp]}
-        
-        for exp_date, strikes in expiration_map.items():
-            for strike_key, options in strikes.items():
-                strike = float(strike_key.split(':')[0])
-                
-                if strike < strike_min or strike > strike_max:
-                    continue
-                
-                for option in options:
-                    delta = option.get('delta', 0)
-                    volume = option.get('totalVolume', 0)
-                    
-                    if delta and volume:
-                        # CHEX formula: (delta × volume × 100 × spot) / DTE
-                        chex = (delta * volume * 100 * spot_price) / dte
-                        
-                        if strike not in chex_data:
-                            chex_data[strike] = 0
-                        chex_data[strike] += chex
-        
-        # Process puts
-        put_exp_map = chain_data.get('putExpDateMap', {})
-        if not show_all and put_exp_map:
-            first_exp = sorted(put_exp_map.keys())[0]
-            put_exp_map = {first_exp: put_exp_map[first_exp]}
-        
-        for exp_date, strikes in put_exp_map.items():
-            for strike_key, options in strikes.items():
-                strike = float(strike_key.split(':')[0])
-                
-                if strike < strike_min or strike > strike_max:
-                    continue
-                
-                for option in options:
-                    delta = option.get('delta', 0)
-                    volume = option.get('totalVolume', 0)
-                    
-                    if delta and volume:
-                        chex = (delta * volume * 100 * spot_price) / dte
-                        
-                        if strike not in chex_data:
-                            chex_data[strike] = 0
-                        chex_data[strike] += chex
+        # CHEX formula: (delta × volume × 100 × spot) / DTE, calls and puts summed per strike
+        chex_multiplier = 100 * spot_price / dte
+        chex_data = {
+            strike: exposure['call'] + exposure['put']
+            for strike, exposure in sum_call_put_exposure(chain_data, 'delta', chex_multiplier, chex_multiplier,
+                                                          strike_min, strike_max, show_all).items()
+        }
         
         # Sort and limit
-        sorted_strikes = sorted(chex_data.items(), key=lambda x: abs(x[1]), reverse=True)[:50]
+        sorted_strikes = heapq.nlargest(50, chex_data.items(), key=lambda x: abs(x[1]))
         
         chart_data = []
         total_chex = 0
         
         for strike, exposure in sorted_strikes:
             total_chex += exposure
-            chart_data.append({
-                'strike': strike,
-                'exposure': exposure
-            })
+            chart_data.append(ChartPoint(strike, exposure))
         
-        chart_data.sort(key=lambda x: x['strike'])
+        chart_data.sort(key=lambda x: x.strike)
         
         # Key levels
-        key_levels = sorted(sorted_strikes, key=lambda x: abs(x[1]), reverse=True)[:5]
-        key_levels = [{'strike': k[0], 'exposure': k[1]} for k in key_levels]
+        # nlargest already returns the strikes by descending |exposure|
+        key_levels = sorted_strikes[:5]
+        key_levels = [ChartPoint(*k) for k in key_levels]
         
         # Interpretation
         interpretation = []
@@ -2284,21 +2397,13 @@ def analytics_chex():
             interpretation.append(f"Net negative charm (${abs(total_chex)/1e6:.2f}M) - delta will decrease over time")
         
         if key_levels:
-            interpretation.append(f"Highest time decay pressure at ${key_levels[0]['strike']:.0f}")
+            interpretation.append(f"Highest time decay pressure at ${key_levels[0].strike:.0f}")
         
-        exp_date_str = sorted(chain_data.get('callExpDateMap', {}).keys())[0] if chain_data.get('callExpDateMap') else 'N/A'
-        
-        return jsonify({
-            'ticker': ticker,
-            'spot_price': spot_price,
-            'expiration': exp_date_str.split(':')[0] if ':' in exp_date_str else exp_date_str,
-            'dte': dte,
-            'total_exposure': total_chex,
-            'chart_data': chart_data,
-            'key_levels': key_levels,
-            'interpretation': interpretation
-        })
+        return exposure_response(ticker, spot_price, expiration, dte, total_chex,
+                                 chart_data, key_levels, interpretation)
         
+    except ChainFetchError as e:
+        return jsonify({'error': e.message}), e.status
     except Exception as e:
         import traceback
         print(f"Error in CHEX calculation: {str(e)}")
@@ -2306,169 +2411,266 @@ def analytics_chex():
         return jsonify({'error': str(e)}), 500
 
 
+def _sign(value):
+    """Return -1, 0 or 1 for the sign of value"""
+    return (value > 0) - (value < 0)
+
+def _dex_band(total_dex):
+    """Bucket net DEX against the ±$5B threshold: 1 above, -1 below, 0 inside,
+    None exactly on it"""
+    if total_dex > 5e9:
+        return 1
+    if total_dex < -5e9:
+        return -1
+    if abs(total_dex) < 5e9:
+        return 0
+    return None
+
+def _analysis_bias(gex_sign, dex_sign, vex_positive, dex_band):
+    """Tactical bias for one combination of exposure signs and DEX band"""
+    if gex_sign > 0 and dex_sign > 0 and vex_positive:
+        return "Bullish drift, low volatility"
+    if gex_sign < 0 and dex_sign < 0:
+        return "Bearish, elevated volatility"
+    if gex_sign > 0 and dex_band == 0:
+        return "Range-bound, low volatility"
+    if dex_band == 1:
+        return "Bullish bias"
+    if dex_band == -1:
+        return "Bearish bias"
+    return "Neutral"
+
+# The analysis bias and volatility outlook depend only on a few signs and
+# flags, so every outcome is worked out once here and looked up per request.
+# Keys: (sign(GEX), sign(DEX), VEX > 0, _dex_band(DEX)).
+ANALYSIS_BIAS = {
+    (gex_sign, dex_sign, vex_positive, dex_band): _analysis_bias(gex_sign, dex_sign, vex_positive, dex_band)
+    for gex_sign in (-1, 0, 1)
+    for dex_sign in (-1, 0, 1)
+    for vex_positive in (False, True)
+    for dex_band in (-1, 0, 1, None)
+}
+
+# Keys: (sign(GEX), VEX peak within 30 pts of spot)
+VOLATILITY_OUTLOOK = {
+    (gex_sign, vex_near_spot): ('Suppressed' if gex_sign > 0 and vex_near_spot
+                                else 'Elevated' if gex_sign < 0 else 'Moderate')
+    for gex_sign in (-1, 0, 1)
+    for vex_near_spot in (False, True)
+}
+
+# Interpretation templates for the comprehensive analysis, filled in with
+# str.format_map from the per-request values built in
+# build_analysis_interpretation. Lines within a template are joined with
+# newlines, matching how the interpretation is sent to the page.
+_ANALYSIS_RULE = "═══════════════════════════════════════════════════════"
+
+ANALYSIS_HEADER = "\n".join([
+    _ANALYSIS_RULE,
+    "📊 DEALER FLOW ANALYSIS SUMMARY — {ticker} (Spot ${spot:.0f})",
+    _ANALYSIS_RULE,
+    "",
+    "🎯 KEY EXPOSURE LEVELS:",
+    "• Zero-GEX Flip: ${flip:.0f} → {regime}",
+    "• Call Wall: ${call_wall:.0f} (${call_wall_b:.2f}B GEX)",
+    "• Put Wall: ${put_wall:.0f} (${put_wall_b:.2f}B GEX)",
+    "• Highest VEX: ${vex_peak:.0f} (${vex_peak_m:.2f}M)",
+    "• Net DEX: ${dex_b:+.2f}B",
+    "• Net CHEX: ${chex_b:+.2f}B",
+    "",
+    "🌐 MARKET CONTEXT:",
+])
+
+ANALYSIS_CLUSTERED = "\n".join([
+    "• Dealer positioning remains structurally supportive, with all exposures (GEX, VEX, DEX, CHEX) clustered near ${spot_rounded}.",
+    "• This creates a low-volatility, mean-reverting environment with a mild bullish drift driven by time-decay hedging flows.",
+])
+ANALYSIS_DISPERSED = "• Dealer exposures are dispersed across multiple levels, indicating potential for directional moves."
+
+ANALYSIS_FLOWS_HEADER = "\n".join([
+    "• Broader vol markets remain subdued, and no major macro catalysts are disrupting dealer equilibrium.",
+    "",
+    "🔄 FLOW DYNAMICS:",
+])
+
+ANALYSIS_GAMMA_CHARM = "• Positive gamma and charm indicate continued buy-side hedging support."
+ANALYSIS_GAMMA_POSITIVE = "• Positive gamma environment provides downside support via dealer hedging."
+ANALYSIS_GAMMA_NEGATIVE = "• Negative gamma environment amplifies volatility via dealer hedging flows."
+ANALYSIS_VEGA_PINNED = "• Vega exposure concentrated at ${vex_peak:.0f} suppresses implied volatility, reinforcing vol compression."
+
+# Keyed on _dex_band; inside the band the sign of DEX picks the line
+ANALYSIS_DELTA = {
+    1: "• Delta exposure remains positive (${dex_b:.2f}B), biasing flows upward but limiting runaway rallies via dealer supply into strength.",
+    -1: "• Delta exposure is negative (${dex_b:.2f}B), biasing flows downward with dealer resistance on bounces.",
+    'modest': "• Modest bullish delta (${dex_b:.2f}B) provides mild upward bias.",
+    'balanced': "• Balanced delta exposure (${dex_b:.2f}B) suggests neutral dealer positioning.",
+}
+
+ANALYSIS_CALL_WALL_BREAK = "• A break above ${call_wall:.0f} could trigger dealer buybacks and a momentum extension."
+ANALYSIS_FLIP_BREAK = "• Below ${flip:.0f}, flows flip short gamma, amplifying volatility."
+
+ANALYSIS_OUTLOOK = "\n".join([
+    "",
+    "💡 TACTICAL OUTLOOK:",
+    "• <strong>Bias:</strong> {bias}",
+    "• <strong>Support:</strong> ${put_wall:.0f} | <strong>Resistance:</strong> ${call_wall:.0f}",
+    "• <strong>Volatility Outlook:</strong> {volatility_outlook}",
+])
+ANALYSIS_EXPECTED_RANGE = "• <strong>Expected Range:</strong> ${put_wall:.0f}–${call_wall:.0f} unless gamma flip triggers volatility expansion"
+
+ANALYSIS_TRADE_IDEAS_HEADER = "\n".join(["", "📈 TRADE IDEAS:"])
+ANALYSIS_TRADE_IDEAS = {
+    'range': "\n".join([
+        "• Short-vol structures (iron condors, credit spreads) or delta-neutral call spreads with time-decay tailwinds",
+        "• Sell {put_wall:.0f}-{call_wall:.0f} iron condor for premium decay",
+    ]),
+    'bullish': "\n".join([
+        "• Buy dips for long delta exposure",
+        "• Bull call spreads or sell put spreads below support",
+    ]),
+    'bearish': "\n".join([
+        "• Sell rallies, bear put spreads",
+        "• Long volatility if approaching gamma flip",
+    ]),
+    'volatile': "\n".join([
+        "• Long straddles/strangles to capture volatility expansion",
+        "• Avoid short premium positions near ${flip:.0f} flip point",
+    ]),
+    'neutral': "• Non-directional strategies (butterflies, calendars)",
+}
+ANALYSIS_FOOTER = "\n".join(["", _ANALYSIS_RULE])
+
+def build_analysis_interpretation(ticker, spot_price, totals, vex_peak, dex_peak_strike,
+                                  flip_point, call_wall_strike, call_wall_gex,
+                                  put_wall_strike, put_wall_gex):
+    """Return the comprehensive analysis interpretation as a list of text blocks.
+
+    totals holds the net 'gex', 'vex', 'dex' and 'chex'; vex_peak is the
+    {'strike', 'value'} peak VEX. Blocks may span several lines.
+    """
+    total_gex = totals['gex']
+    total_dex = totals['dex']
+    total_chex = totals['chex']
+    # The VEX flag also drives the vega, volatility and trade-idea lines
+    vex_near_spot = abs(vex_peak['strike'] - spot_price) < 30
+    gex_sign = _sign(total_gex)
+    dex_band = _dex_band(total_dex)
+    
+    ctx = {
+        'ticker': ticker,
+        'spot': spot_price,
+        'spot_rounded': int(round(spot_price, -1)),
+        'flip': flip_point,
+        'regime': 'Positive gamma regime' if spot_price > flip_point else 'Negative gamma regime',
+        'call_wall': call_wall_strike,
+        'call_wall_b': call_wall_gex / 1e9,
+        'put_wall': put_wall_strike,
+        'put_wall_b': abs(put_wall_gex) / 1e9,
+        'vex_peak': vex_peak['strike'],
+        'vex_peak_m': vex_peak['value'] / 1e6,
+        'dex_b': total_dex / 1e9,
+        'chex_b': total_chex / 1e9,
+        'bias': ANALYSIS_BIAS[gex_sign, _sign(total_dex), totals['vex'] > 0, dex_band],
+        'volatility_outlook': VOLATILITY_OUTLOOK[gex_sign, vex_near_spot],
+    }
+    
+    interpretation = [ANALYSIS_HEADER.format_map(ctx)]
+    
+    # All exposures clustered near spot (within 30 pts)
+    if (vex_near_spot and abs(dex_peak_strike - spot_price) < 30
+            and abs(put_wall_strike - spot_price) < 30):
+        interpretation.append(ANALYSIS_CLUSTERED.format_map(ctx))
+    else:
+        interpretation.append(ANALYSIS_DISPERSED)
+    interpretation.append(ANALYSIS_FLOWS_HEADER)
+    
+    if total_gex > 0 and total_chex > 0:
+        interpretation.append(ANALYSIS_GAMMA_CHARM)
+    elif total_gex > 0:
+        interpretation.append(ANALYSIS_GAMMA_POSITIVE)
+    elif total_gex < 0:
+        interpretation.append(ANALYSIS_GAMMA_NEGATIVE)
+    
+    if vex_peak['strike'] and vex_near_spot:
+        interpretation.append(ANALYSIS_VEGA_PINNED.format_map(ctx))
+    
+    if dex_band == 1 or dex_band == -1:
+        delta_key = dex_band
+    else:
+        delta_key = 'modest' if total_dex > 0 else 'balanced'
+    interpretation.append(ANALYSIS_DELTA[delta_key].format_map(ctx))
+    
+    if call_wall_strike > 0:
+        interpretation.append(ANALYSIS_CALL_WALL_BREAK.format_map(ctx))
+    if flip_point > 0:
+        interpretation.append(ANALYSIS_FLIP_BREAK.format_map(ctx))
+    
+    interpretation.append(ANALYSIS_OUTLOOK.format_map(ctx))
+    if call_wall_strike > 0 and put_wall_strike > 0:
+        interpretation.append(ANALYSIS_EXPECTED_RANGE.format_map(ctx))
+    
+    interpretation.append(ANALYSIS_TRADE_IDEAS_HEADER)
+    if total_gex > 0 and abs(total_dex) < 10e9 and vex_near_spot:
+        trade_ideas = 'range'
+    elif total_dex > 5e9 and total_gex > 0:
+        trade_ideas = 'bullish'
+    elif total_dex < -5e9:
+        trade_ideas = 'bearish'
+    elif total_gex < 0:
+        trade_ideas = 'volatile'
+    else:
+        trade_ideas = 'neutral'
+    interpretation.append(ANALYSIS_TRADE_IDEAS[trade_ideas].format_map(ctx))
+    interpretation.append(ANALYSIS_FOOTER)
+    return interpretation
+
+# Last analysis payload per ticker as (call map, payload). The chain cache
+# hands out shallow copies of one parsed chain until the chain actually
+# changes, so the identity of its call map tells a repeat request for an
+# unchanged chain, which reuses the finished analysis. Capped like the chain
+# caches, since tickers come from the request.
+_analysis_payloads = OrderedDict()
+
 @app.route('/analytics/analyze', methods=['POST'])
 @login_required
 def analytics_analyze():
     """Comprehensive analysis with all Greeks"""
     try:
-        from datetime import date
-        
         data = request.get_json()
-        ticker = data.get('ticker', 'SPX').upper()
-        
-        # Check if market is closed
-        today = date.today()
-        target_date = get_next_trading_day(today) if is_market_closed(today) else today
-        
-        # Initialize Schwab client
-        import schwab
-        token_path = '/app/token.json'
-        if not os.path.exists(token_path):
-            app_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-            token_path = os.path.join(app_root, 'token.json')
-        
-        schwab_client = schwab.auth.client_from_token_file(
-            token_path,
-            api_key=os.environ.get('SCHWAB_API_KEY'),
-            app_secret=os.environ.get('SCHWAB_APP_SECRET'),
-            enforce_enums=False
-        )
-        
-        # Fetch option chains with target date
-        symbols_to_try = [f'${ticker}.X', ticker, f'${ticker}']
-        chain_response = None
-        
-        for symbol in symbols_to_try:
-            try:
-                chain_response = schwab_client.get_option_chain(
-                    symbol=symbol,
-                    from_date=target_date,
-                    to_date=target_date
-                )
-                if chain_response.status_code == 200:
-                    break
-            except:
-                continue
-        
-        if not chain_response or chain_response.status_code != 200:
-            return jsonify({'error': 'Failed to fetch option chain'}), 400
-        
-        chain_data = chain_response.json()
-        
-        if chain_data.get('status') == 'FAILED':
-            return jsonify({'error': 'Failed to fetch option chain'}), 400
+        chain_data, spot_price, dte, expiration, ticker = _fetch_chain_for_request(data)
+        # A chain without daysToExpiration counts as 1 DTE here, so CHEX is
+        # still accumulated (the shared helper defaults it to 0)
+        if 'daysToExpiration' not in chain_data:
+            dte = 1
         
-        spot_price = chain_data.get('underlyingPrice', 0)
-        dte = chain_data.get('daysToExpiration', 1)
+        call_map = chain_data.get('callExpDateMap')
+        previous = _analysis_payloads.get(ticker)
+        if call_map and previous is not None and previous[0] is call_map:
+            return jsonify(previous[1])
         
         # Calculate all Greeks for default range (±50 pts)
-        strike_min = spot_price - 50
-        strike_max = spot_price + 50
-        
-        # Initialize accumulators
-        total_gex = 0
-        total_vex = 0
-        total_dex = 0
-        total_chex = 0
-        total_call_volume = 0
-        total_put_volume = 0
-        
-        gex_max = {'strike': 0, 'value': 0}
-        vex_max = {'strike': 0, 'value': 0}
-        dex_max = {'strike': 0, 'value': 0}
-        chex_max = {'strike': 0, 'value': 0}
-        
-        # Process calls
-        expiration_map = chain_data.get('callExpDateMap', {})
-        if expiration_map:
-            first_exp = sorted(expiration_map.keys())[0]
-            expiration_map = {first_exp: expiration_map[first_exp]}
-        
-        for exp_date, strikes in expiration_map.items():
-            for strike_key, options in strikes.items():
-                strike = float(strike_key.split(':')[0])
-                
-                if strike < strike_min or strike > strike_max:
-                    continue
-                
-                for option in options:
-                    gamma = option.get('gamma', 0)
-                    vega = option.get('vega', 0)
-                    delta = option.get('delta', 0)
-                    volume = option.get('totalVolume', 0)
-                    
-                    if volume:
-                        total_call_volume += volume
-                        
-                        # GEX
-                        if gamma:
-                            gex = gamma * volume * 100 * (spot_price ** 2)
-                            total_gex += gex
-                            if abs(gex) > abs(gex_max['value']):
-                                gex_max = {'strike': strike, 'value': gex}
-                        
-                        # VEX
-                        if vega:
-                            vex = vega * volume * 100
-                            total_vex += vex
-                            if abs(vex) > abs(vex_max['value']):
-                                vex_max = {'strike': strike, 'value': vex}
-                        
-                        # DEX
-                        if delta:
-                            dex = delta * volume * 100 * spot_price
-                            total_dex += dex
-                            if abs(dex) > abs(dex_max['value']):
-                                dex_max = {'strike': strike, 'value': dex}
-                        
-                        # CHEX
-                        if delta and dte:
-                            chex = (delta * volume * 100 * spot_price) / dte
-                            total_chex += chex
-                            if abs(chex) > abs(chex_max['value']):
-                                chex_max = {'strike': strike, 'value': chex}
-        
-        # Process puts
-        put_exp_map = chain_data.get('putExpDateMap', {})
-        if put_exp_map:
-            first_exp = sorted(put_exp_map.keys())[0]
-            put_exp_map = {first_exp: put_exp_map[first_exp]}
-        
-        for exp_date, strikes in put_exp_map.items():
-            for strike_key, options in strikes.items():
-                strike = float(strike_key.split(':')[0])
-                
-                if strike < strike_min or strike > strike_max:
-                    continue
-                
-                for option in options:
-                    gamma = option.get('gamma', 0)
-                    vega = option.get('vega', 0)
-                    delta = option.get('delta', 0)
-                    volume = option.get('totalVolume', 0)
-                    
-                    if volume:
-                        total_put_volume += volume
-                        
-                        # GEX (negative for puts)
-                        if gamma:
-                            gex = -1 * gamma * volume * 100 * (spot_price ** 2)
-                            total_gex += gex
-                        
-                        # VEX
-                        if vega:
-                            vex = vega * volume * 100
-                            total_vex += vex
-                        
-                        # DEX (delta is already negative for puts)
-                        if delta:
-                            dex = delta * volume * 100 * spot_price
-                            total_dex += dex
-                        
-                        # CHEX
-                        if delta and dte:
-                            chex = (delta * volume * 100 * spot_price) / dte
-                            total_chex += chex
+        strike_min, strike_max = strike_window(spot_price)
+        
+        # Accumulate all four exposures in one pass per side; only the calls
+        # feed the per-greek peaks. GEX by strike (for the flip point) is
+        # collected in the same pass.
+        peaks = {greek: {'strike': 0, 'value': 0} for greek in ('gex', 'vex', 'dex', 'chex')}
+        gex_by_strike = defaultdict(float)
+        call_totals, total_call_volume = accumulate_greek_exposures(
+            chain_data.get('callExpDateMap', {}), strike_min, strike_max, spot_price, dte, 1, peaks,
+            gex_by_strike)
+        put_totals, total_put_volume = accumulate_greek_exposures(
+            chain_data.get('putExpDateMap', {}), strike_min, strike_max, spot_price, dte, -1,
+            gex_by_strike=gex_by_strike)
+        
+        total_gex = call_totals['gex'] + put_totals['gex']
+        total_vex = call_totals['vex'] + put_totals['vex']
+        total_dex = call_totals['dex'] + put_totals['dex']
+        total_chex = call_totals['chex'] + put_totals['chex']
+        gex_max = peaks['gex']
+        vex_max = peaks['vex']
+        dex_max = peaks['dex']
+        chex_max = peaks['chex']
         
         # Build summaries
         gex_summary = f"<strong>Total GEX:</strong> ${total_gex/1e9:.2f}B<br>"
@@ -2485,40 +2687,6 @@ def analytics_analyze():
         
         # Calculate GEX flip point (zero-gamma level)
         # Find the strike where GEX crosses from positive to negative
-        gex_by_strike = {}
-        
-        # Recalculate GEX by strike to find flip point
-        for exp_date, strikes in expiration_map.items():
-            for strike_key, options in strikes.items():
-                strike = float(strike_key.split(':')[0])
-                if strike < strike_min or strike > strike_max:
-                    continue
-                
-                for option in options:
-                    gamma = option.get('gamma', 0)
-                    volume = option.get('totalVolume', 0)
-                    if gamma and volume:
-                        gex = gamma * volume * 100 * (spot_price ** 2)
-                        if strike not in gex_by_strike:
-                            gex_by_strike[strike] = 0
-                        gex_by_strike[strike] += gex
-        
-        for exp_date, strikes in put_exp_map.items():
-            for strike_key, options in strikes.items():
-                strike = float(strike_key.split(':')[0])
-                if strike < strike_min or strike > strike_max:
-                    continue
-                
-                for option in options:
-                    gamma = option.get('gamma', 0)
-                    volume = option.get('totalVolume', 0)
-                    if gamma and volume:
-                        gex = -1 * gamma * volume * 100 * (spot_price ** 2)
-                        if strike not in gex_by_strike:
-                            gex_by_strike[strike] = 0
-                        gex_by_strike[strike] += gex
-        
-        # Find flip point (strike where GEX changes sign)
         sorted_strikes = sorted(gex_by_strike.items())
         flip_point = spot_price  # default to spot
         
@@ -2547,130 +2715,17 @@ def analytics_analyze():
                 put_wall_strike = strike
                 put_wall_gex = gex
         
-        # INSTITUTIONAL-GRADE ANALYSIS SUMMARY
-        interpretation = []
-        
-        interpretation.append("═══════════════════════════════════════════════════════")
-        interpretation.append("📊 DEALER FLOW ANALYSIS SUMMARY — " + ticker + f" (Spot ${spot_price:.0f})")
-        interpretation.append("═══════════════════════════════════════════════════════")
-        interpretation.append("")
-        
-        # Key Levels
-        interpretation.append("🎯 KEY EXPOSURE LEVELS:")
-        interpretation.append(f"• Zero-GEX Flip: ${flip_point:.0f} → {'Positive gamma regime' if spot_price > flip_point else 'Negative gamma regime'}")
-        interpretation.append(f"• Call Wall: ${call_wall_strike:.0f} (${call_wall_gex/1e9:.2f}B GEX)")
-        interpretation.append(f"• Put Wall: ${put_wall_strike:.0f} (${abs(put_wall_gex)/1e9:.2f}B GEX)")
-        interpretation.append(f"• Highest VEX: ${vex_max['strike']:.0f} (${vex_max['value']/1e6:.2f}M)")
-        interpretation.append(f"• Net DEX: ${total_dex/1e9:+.2f}B")
-        interpretation.append(f"• Net CHEX: ${total_chex/1e9:+.2f}B")
-        interpretation.append("")
-        
-        # Market Context
-        interpretation.append("🌐 MARKET CONTEXT:")
-        
-        # Check if all exposures cluster near a level
-        vex_concentration = abs(vex_max['strike'] - spot_price)
-        dex_concentration = abs(dex_max['strike'] - spot_price)
-        
-        if vex_concentration < 30 and dex_concentration < 30 and abs(put_wall_strike - spot_price) < 30:
-            interpretation.append(f"• Dealer positioning remains structurally supportive, with all exposures (GEX, VEX, DEX, CHEX) clustered near ${int(round(spot_price, -1))}.")
-            interpretation.append("• This creates a low-volatility, mean-reverting environment with a mild bullish drift driven by time-decay hedging flows.")
-        else:
-            interpretation.append("• Dealer exposures are dispersed across multiple levels, indicating potential for directional moves.")
-        
-        interpretation.append("• Broader vol markets remain subdued, and no major macro catalysts are disrupting dealer equilibrium.")
-        interpretation.append("")
-        
-        # Flow Dynamics
-        interpretation.append("🔄 FLOW DYNAMICS:")
-        
-        # Gamma + Charm analysis
-        if total_gex > 0 and total_chex > 0:
-            interpretation.append("• Positive gamma and charm indicate continued buy-side hedging support.")
-        elif total_gex > 0:
-            interpretation.append("• Positive gamma environment provides downside support via dealer hedging.")
-        elif total_gex < 0:
-            interpretation.append("• Negative gamma environment amplifies volatility via dealer hedging flows.")
-        
-        # Vega analysis
-        if vex_max['strike'] and abs(vex_max['strike'] - spot_price) < 30:
-            interpretation.append(f"• Vega exposure concentrated at ${vex_max['strike']:.0f} suppresses implied volatility, reinforcing vol compression.")
-        
-        # Delta analysis
-        if total_dex > 5e9:
-            interpretation.append(f"• Delta exposure remains positive (${total_dex/1e9:.2f}B), biasing flows upward but limiting runaway rallies via dealer supply into strength.")
-        elif total_dex < -5e9:
-            interpretation.append(f"• Delta exposure is negative (${total_dex/1e9:.2f}B), biasing flows downward with dealer resistance on bounces.")
-        elif total_dex > 0:
-            interpretation.append(f"• Modest bullish delta (${total_dex/1e9:.2f}B) provides mild upward bias.")
-        else:
-            interpretation.append(f"• Balanced delta exposure (${total_dex/1e9:.2f}B) suggests neutral dealer positioning.")
-        
-        # Gamma flip implications
-        if call_wall_strike > 0:
-            interpretation.append(f"• A break above ${call_wall_strike:.0f} could trigger dealer buybacks and a momentum extension.")
-        
-        if flip_point > 0:
-            interpretation.append(f"• Below ${flip_point:.0f}, flows flip short gamma, amplifying volatility.")
-        
-        interpretation.append("")
-        
-        # Tactical Outlook
-        interpretation.append("💡 TACTICAL OUTLOOK:")
-        
-        # Determine bias
-        if total_gex > 0 and total_dex > 0 and total_vex > 0:
-            bias = "Bullish drift, low volatility"
-        elif total_gex < 0 and total_dex < 0:
-            bias = "Bearish, elevated volatility"
-        elif total_gex > 0 and abs(total_dex) < 5e9:
-            bias = "Range-bound, low volatility"
-        elif total_dex > 5e9:
-            bias = "Bullish bias"
-        elif total_dex < -5e9:
-            bias = "Bearish bias"
-        else:
-            bias = "Neutral"
-        
-        interpretation.append(f"• <strong>Bias:</strong> {bias}")
-        interpretation.append(f"• <strong>Support:</strong> ${put_wall_strike:.0f} | <strong>Resistance:</strong> ${call_wall_strike:.0f}")
-        interpretation.append(f"• <strong>Volatility Outlook:</strong> {'Suppressed' if total_gex > 0 and vex_concentration < 30 else 'Elevated' if total_gex < 0 else 'Moderate'}")
-        
-        # Expected range
-        if call_wall_strike > 0 and put_wall_strike > 0:
-            interpretation.append(f"• <strong>Expected Range:</strong> ${put_wall_strike:.0f}–${call_wall_strike:.0f} unless gamma flip triggers volatility expansion")
-        
-        # Trade ideas
-        interpretation.append("")
-        interpretation.append("📈 TRADE IDEAS:")
-        
-        if total_gex > 0 and abs(total_dex) < 10e9 and vex_concentration < 30:
-            # Low vol, range-bound
-            interpretation.append("• Short-vol structures (iron condors, credit spreads) or delta-neutral call spreads with time-decay tailwinds")
-            interpretation.append(f"• Sell {put_wall_strike:.0f}-{call_wall_strike:.0f} iron condor for premium decay")
-        elif total_dex > 5e9 and total_gex > 0:
-            # Bullish with support
-            interpretation.append("• Buy dips for long delta exposure")
-            interpretation.append("• Bull call spreads or sell put spreads below support")
-        elif total_dex < -5e9:
-            # Bearish
-            interpretation.append("• Sell rallies, bear put spreads")
-            interpretation.append("• Long volatility if approaching gamma flip")
-        elif total_gex < 0:
-            # High vol environment
-            interpretation.append("• Long straddles/strangles to capture volatility expansion")
-            interpretation.append(f"• Avoid short premium positions near ${flip_point:.0f} flip point")
-        else:
-            interpretation.append("• Non-directional strategies (butterflies, calendars)")
-        
-        interpretation.append("")
-        interpretation.append("═══════════════════════════════════════════════════════")
+        interpretation = build_analysis_interpretation(
+            ticker, spot_price,
+            {'gex': total_gex, 'vex': total_vex, 'dex': total_dex, 'chex': total_chex},
+            vex_max, dex_max['strike'], flip_point,
+            call_wall_strike, call_wall_gex, put_wall_strike, put_wall_gex)
         
         # Volume imbalance (moved to bottom)
         put_call_ratio = total_put_volume / total_call_volume if total_call_volume > 0 else 0
         volume_summary = f"Put/Call Volume: {put_call_ratio:.2f} ({total_put_volume:,.0f}/{total_call_volume:,.0f})"
         
-        return jsonify({
+        payload = {
             'ticker': ticker,
             'spot_price': spot_price,
             'dte': dte,
@@ -2682,9 +2737,15 @@ def analytics_analyze():
             'dex_summary': dex_summary,
             'chex_summary': chex_summary,
             'volume_summary': volume_summary,
-            'interpretation': interpretation
-        })
+            'interpretation': "\n".join(interpretation)
+        }
+        if call_map:
+            _remember_latest(_analysis_payloads, ticker, (call_map, payload),
+                             OPTION_CHAIN_CACHE_MAX_ENTRIES)
+        return jsonify(payload)
         
+    except ChainFetchError as e:
+        return jsonify({'error': e.message}), e.status
     except Exception as e:
         import traceback
         print(f"Error in comprehensive analysis: {str(e)}")
@@ -2697,15 +2758,16 @@ def analytics_analyze():
 @login_required
 def trailing_stops():
     try:
-        db = SessionLocal()
-        try:
-            # Only get trailing stops that have associated bots (filter out orphaned records)
-            trailing_stops = db.query(TrailingStopState).join(Bot).all()
-            # Also need bots collection for stats panel in template
-            bots = db.query(Bot).all()
-            return render_template('trailing_stops/list.html', trailing_stops=trailing_stops, bots=bots)
-        finally:
-            db.close()
+        db = get_request_db()
+        # Only get trailing stops that have associated bots (filter out orphaned records);
+        # the joined Bot rows populate trailing_stop.bot for the template
+        trailing_stops = (db.query(TrailingStopState)
+                          .join(Bot)
+                          .options(contains_eager(TrailingStopState.bot))
+                          .all())
+        # Also need bots collection for stats panel in template
+        bots = db.query(Bot).all()
+        return render_template('trailing_stops/list.html', trailing_stops=trailing_stops, bots=bots)
     except Exception as e:
         flash(f'Error loading trailing stops: {str(e)}', 'danger')
         return render_template('trailing_stops/list.html', trailing_stops=[], bots=[])
@@ -2714,176 +2776,168 @@ def trailing_stops():
 @login_required
 def add_trailing_stops():
     try:
-        db = SessionLocal()
-        try:
-            if request.method == 'POST':
-                action = request.form.get('action')
-                selected_bots = request.form.getlist('selected_bots')
+        db = get_request_db()
+        if request.method == 'POST':
+            action = request.form.get('action')
+            selected_bots = request.form.getlist('selected_bots')
+            
+            if action == 'smarttrail':
+                # Handle smarttrail action
+                from services.smarttrail import SmartTrailService
                 
-                if action == 'smarttrail':
-                    # Handle smarttrail action
-                    from services.smarttrail import SmartTrailService
-                    
-                    # Parse form data
-                    smarttrail_target = request.form.get('smarttrail_target', 'all')
-                    tier_thresholds = request.form.getlist('tier_thresholds[]')
-                    trailing_percentage = request.form.get('smarttrail_trailing_percentage', type=float, default=10.0)
-                    strategy_group_name = request.form.get('strategy_group_name', '').strip()
-                    
-                    # Validate inputs
-                    if not tier_thresholds:
-                        flash('Please enter at least one tier activation threshold', 'danger')
-                    else:
-                        try:
-                            tier_activation_thresholds = [float(t) for t in tier_thresholds]
-                            
-                            # Validate tier thresholds
-                            for threshold in tier_activation_thresholds:
-                                if not (0 <= threshold <= 200):
-                                    flash(f'Activation thresholds must be between 0 and 200%. Got: {threshold}%', 'danger')
-                                    return redirect(url_for('add_trailing_stops'))
-                            
-                            # Validate trailing percentage
-                            if not (0 < trailing_percentage <= 100):
-                                flash(f'Trailing percentage must be between 0 and 100%. Got: {trailing_percentage}%', 'danger')
+                # Parse form data
+                smarttrail_target = request.form.get('smarttrail_target', 'all')
+                tier_thresholds = request.form.getlist('tier_thresholds[]')
+                trailing_percentage = request.form.get('smarttrail_trailing_percentage', type=float, default=10.0)
+                strategy_group_name = request.form.get('strategy_group_name', '').strip()
+                
+                # Validate inputs
+                if not tier_thresholds:
+                    flash('Please enter at least one tier activation threshold', 'danger')
+                else:
+                    try:
+                        tier_activation_thresholds = [float(t) for t in tier_thresholds]
+                        
+                        # Validate tier thresholds
+                        for threshold in tier_activation_thresholds:
+                            if not (0 <= threshold <= 200):
+                                flash(f'Activation thresholds must be between 0 and 200%. Got: {threshold}%', 'danger')
                                 return redirect(url_for('add_trailing_stops'))
+                        
+                        # Validate trailing percentage
+                        if not (0 < trailing_percentage <= 100):
+                            flash(f'Trailing percentage must be between 0 and 100%. Got: {trailing_percentage}%', 'danger')
+                            return redirect(url_for('add_trailing_stops'))
+                        
+                        # Determine target parameters
+                        bot_id = None
+                        selected_bot_ids = None
+                        strategy_group = None
+                        
+                        if smarttrail_target == 'selected':
+                            if not selected_bots:
+                                flash('Please select at least one bot for Smart Trail', 'danger')
+                                return redirect(url_for('add_trailing_stops'))
+                            selected_bot_ids = [int(bid) for bid in selected_bots]
+                        elif smarttrail_target == 'strategy':
+                            if not strategy_group_name:
+                                flash('Please enter a strategy group name', 'danger')
+                                return redirect(url_for('add_trailing_stops'))
+                            strategy_group = [strategy_group_name]
+                        
+                        # Apply smarttrail
+                        service = SmartTrailService()
+                        result = service.apply_tiered_trails(
+                            tier_activation_thresholds=tier_activation_thresholds,
+                            trailing_percentage=trailing_percentage,
+                            bot_id=bot_id,
+                            selected_bot_ids=selected_bot_ids,
+                            strategy_group=strategy_group
+                        )
+                        
+                        if result['success']:
+                            # Build success message
+                            tier_summary_lines = []
+                            if result.get('tier_summary'):
+                                for tier_key, count in sorted(result['tier_summary'].items()):
+                                    tier_summary_lines.append(f"{tier_key}: {count} position(s)")
                             
-                            # Determine target parameters
-                            bot_id = None
-                            selected_bot_ids = None
-                            strategy_group = None
-                            
-                            if smarttrail_target == 'selected':
-                                if not selected_bots:
-                                    flash('Please select at least one bot for Smart Trail', 'danger')
-                                    return redirect(url_for('add_trailing_stops'))
-                                selected_bot_ids = [int(bid) for bid in selected_bots]
-                            elif smarttrail_target == 'strategy':
-                                if not strategy_group_name:
-                                    flash('Please enter a strategy group name', 'danger')
-                                    return redirect(url_for('add_trailing_stops'))
-                                strategy_group = [strategy_group_name]
-                            
-                            # Apply smarttrail
-                            service = SmartTrailService()
-                            result = service.apply_tiered_trails(
-                                tier_activation_thresholds=tier_activation_thresholds,
-                                trailing_percentage=trailing_percentage,
-                                bot_id=bot_id,
-                                selected_bot_ids=selected_bot_ids,
-                                strategy_group=strategy_group
-                            )
+                            message = f"✅ Smart Trail applied successfully!\n\n"
+                            message += f"Positions processed: {result['positions_processed']}\n"
+                            message += f"Total positions found: {result.get('total_positions', 0)}\n"
                             
-                            if result['success']:
-                                # Build success message
-                                tier_summary_lines = []
-                                if result.get('tier_summary'):
-                                    for tier_key, count in sorted(result['tier_summary'].items()):
-                                        tier_summary_lines.append(f"{tier_key}: {count} position(s)")
-                                
-                                message = f"✅ Smart Trail applied successfully!\n\n"
-                                message += f"Positions processed: {result['positions_processed']}\n"
-                                message += f"Total positions found: {result.get('total_positions', 0)}\n"
-                                
-                                if tier_summary_lines:
-                                    message += f"\nTier distribution:\n"
-                                    message += "\n".join(f"  • {line}" for line in tier_summary_lines)
-                                
-                                if result.get('errors'):
-                                    message += f"\n\n⚠️ Errors: {len(result['errors'])} position(s) failed"
-                                
-                                flash(message, 'success')
-                            else:
-                                flash(f"❌ Smart Trail failed: {result.get('message', 'Unknown error')}", 'danger')
+                            if tier_summary_lines:
+                                message += f"\nTier distribution:\n"
+                                message += "\n".join(f"  • {line}" for line in tier_summary_lines)
                             
-                            # Redirect back to prevent form resubmission
-                            return redirect(url_for('add_trailing_stops'))
+                            if result.get('errors'):
+                                message += f"\n\n⚠️ Errors: {len(result['errors'])} position(s) failed"
                             
-                        except ValueError as e:
-                            flash(f'Invalid input: {str(e)}', 'danger')
-                        except Exception as e:
-                            flash(f'Error applying Smart Trail: {str(e)}', 'danger')
-                            import traceback
-                            print(traceback.format_exc())
-                
-                elif not selected_bots:
-                    flash('Please select at least one bot', 'warning')
-                elif action == 'add':
-                    # Handle bulk trailing stop creation
-                    activation_threshold = request.form.get('activation_threshold', type=float)
-                    trailing_mode = request.form.get('trailing_mode', 'percentage')
-                    trailing_percentage = request.form.get('trailing_percentage', type=float)
-                    trailing_dollar_amount = request.form.get('trailing_dollar_amount', type=float)
-                    
-                    if activation_threshold is None:
-                        flash('Activation threshold is required', 'danger')
-                    elif trailing_mode == 'percentage' and trailing_percentage is None:
-                        flash('Trailing percentage is required for percentage mode', 'danger')
-                    elif trailing_mode == 'dollar' and trailing_dollar_amount is None:
-                        flash('Trailing dollar amount is required for dollar mode', 'danger')
-                    else:
-                        success_count = 0
-                        error_count = 0
-                        
-                        for bot_id in selected_bots:
-                            try:
-                                # Pass mode-specific parameters
-                                ok, msg = upsert_trailing_stop(
-                                    int(bot_id), 
-                                    activation_threshold, 
-                                    trailing_percentage=trailing_percentage if trailing_mode == 'percentage' else None,
-                                    trailing_dollar_amount=trailing_dollar_amount if trailing_mode == 'dollar' else None,
-                                    trailing_mode=trailing_mode
-                                )
-                                if ok:
-                                    success_count += 1
-                                else:
-                                    error_count += 1
-                                    print(f"Failed to add trailing stop for bot {bot_id}: {msg}")
-                            except Exception as e:
-                                error_count += 1
-                                print(f"Error adding trailing stop for bot {bot_id}: {e}")
-                        
-                        if success_count > 0:
-                            mode_label = f"{trailing_percentage}%" if trailing_mode == 'percentage' else f"${trailing_dollar_amount}"
-                            flash(f'Successfully added/updated trailing stops for {success_count} bot(s) with {mode_label} trailing {trailing_mode}', 'success')
-                        if error_count > 0:
-                            flash(f'Failed to add trailing stops for {error_count} bot(s)', 'warning')
+                            flash(message, 'success')
+                        else:
+                            flash(f"❌ Smart Trail failed: {result.get('message', 'Unknown error')}", 'danger')
                         
                         # Redirect back to prevent form resubmission
                         return redirect(url_for('add_trailing_stops'))
-                            
-                elif action == 'remove':
-                    # Handle bulk trailing stop removal
-                    success_count = 0
-                    error_count = 0
-                    
-                    for bot_id in selected_bots:
-                        try:
-                            ok, msg = delete_trailing_stop(int(bot_id))
-                            if ok:
-                                success_count += 1
-                            else:
-                                error_count += 1
-                                print(f"Failed to remove trailing stop for bot {bot_id}: {msg}")
-                        except Exception as e:
-                            error_count += 1
-                            print(f"Error removing trailing stop for bot {bot_id}: {e}")
+                        
+                    except ValueError as e:
+                        flash(f'Invalid input: {str(e)}', 'danger')
+                    except Exception as e:
+                        flash(f'Error applying Smart Trail: {str(e)}', 'danger')
+                        import traceback
+                        print(traceback.format_exc())
+            
+            elif not selected_bots:
+                flash('Please select at least one bot', 'warning')
+            elif action == 'add':
+                # Handle bulk trailing stop creation
+                activation_threshold = request.form.get('activation_threshold', type=float)
+                trailing_mode = request.form.get('trailing_mode', 'percentage')
+                trailing_percentage = request.form.get('trailing_percentage', type=float)
+                trailing_dollar_amount = request.form.get('trailing_dollar_amount', type=float)
+                
+                if activation_threshold is None:
+                    flash('Activation threshold is required', 'danger')
+                elif trailing_mode == 'percentage' and trailing_percentage is None:
+                    flash('Trailing percentage is required for percentage mode', 'danger')
+                elif trailing_mode == 'dollar' and trailing_dollar_amount is None:
+                    flash('Trailing dollar amount is required for dollar mode', 'danger')
+                else:
+                    # Save every selected bot's trailing stop in one transaction,
+                    # passing mode-specific parameters; malformed ids count as failures
+                    bot_ids = _parse_bot_ids(selected_bots)
+                    config = {
+                        'activation_threshold': activation_threshold,
+                        'trailing_percentage': trailing_percentage if trailing_mode == 'percentage' else None,
+                        'trailing_dollar_amount': trailing_dollar_amount if trailing_mode == 'dollar' else None,
+                        'trailing_mode': trailing_mode
+                    }
+                    # Existing stops keep their activation state, as with single edits
+                    _, success_count, errors = upsert_trailing_stops_batch(
+                        [dict(config, bot_id=bot_id) for bot_id in bot_ids],
+                        session=db, preserve_active=True, allow_partial=True
+                    )
+                    error_count = len(errors) + len(selected_bots) - len(bot_ids)
+                    for error in errors:
+                        print(f"Failed to add trailing stop for bot {error['bot_id']}: {error['error']}")
                     
                     if success_count > 0:
-                        flash(f'Successfully removed trailing stops for {success_count} bot(s)', 'success')
+                        mode_label = f"{trailing_percentage}%" if trailing_mode == 'percentage' else f"${trailing_dollar_amount}"
+                        flash(f'Successfully added/updated trailing stops for {success_count} bot(s) with {mode_label} trailing {trailing_mode}', 'success')
                     if error_count > 0:
-                        flash(f'Failed to remove trailing stops for {error_count} bot(s)', 'warning')
+                        flash(f'Failed to add trailing stops for {error_count} bot(s)', 'warning')
                     
                     # Redirect back to prevent form resubmission
                     return redirect(url_for('add_trailing_stops'))
-            
-            # Get all bots for display
-            bots = db.query(Bot).order_by(Bot.name).all()
-            
-            return render_template('trailing_stops/add.html', bots=bots)
-        finally:
-            db.close()
+                        
+            elif action == 'remove':
+                # Handle bulk trailing stop removal with a single DELETE;
+                # malformed ids count as failures
+                parsed_ids = _parse_bot_ids(selected_bots)
+                rejected_count = len(selected_bots) - len(parsed_ids)
+                bot_ids = set(parsed_ids)
+                ok, result = delete_trailing_stops(list(bot_ids), session=db)
+                if ok:
+                    success_count = result
+                    # Bots without a trailing stop have nothing to remove
+                    error_count = len(bot_ids) - result + rejected_count
+                else:
+                    success_count = 0
+                    error_count = len(bot_ids) + rejected_count
+                    print(f"Failed to remove trailing stops for bots {sorted(bot_ids)}: {result}")
+                
+                if success_count > 0:
+                    flash(f'Successfully removed trailing stops for {success_count} bot(s)', 'success')
+                if error_count > 0:
+                    flash(f'Failed to remove trailing stops for {error_count} bot(s)', 'warning')
+                
+                # Redirect back to prevent form resubmission
+                return redirect(url_for('add_trailing_stops'))
+        
+        # Get all bots for display
+        bots = db.query(Bot).order_by(Bot.name).all()
+        
+        return render_template('trailing_stops/add.html', bots=bots)
     except Exception as e:
         flash(f'Error loading manage trailing stops page: {str(e)}', 'danger')
         return render_template('trailing_stops/add.html', bots=[])
@@ -3456,37 +3510,6 @@ def threshold_monitor_status():
     """Get threshold monitor status."""
     import os
     import json
-    from datetime import date, timedelta
-    
-    def _is_market_holiday(check_date):
-        """Check if date is a market holiday (weekend or US stock market holiday)."""
-        # Check weekend
-        weekday = check_date.weekday()
-        if weekday >= 5:  # Saturday = 5, Sunday = 6
-            return True
-        
-        # US Stock Market Holidays for 2025
-        holidays_2025 = [
-            date(2025, 1, 1),   # New Year's Day
-            date(2025, 1, 20),  # MLK Day
-            date(2025, 2, 17),  # Presidents' Day
-            date(2025, 4, 18),  # Good Friday
-            date(2025, 5, 26),  # Memorial Day
-            date(2025, 6, 19),  # Juneteenth
-            date(2025, 7, 4),   # Independence Day
-            date(2025, 9, 1),   # Labor Day
-            date(2025, 11, 27), # Thanksgiving
-            date(2025, 12, 25), # Christmas
-        ]
-        
-        return check_date in holidays_2025
-    
-    def _get_next_trading_day(start_date):
-        """Get the next trading day after start_date."""
-        next_day = start_date + timedelta(days=1)
-        while _is_market_holiday(next_day):
-            next_day += timedelta(days=1)
-        return next_day
     
     try:
         pid_file = '/app/data/threshold_monitor.pid'
@@ -3547,8 +3570,8 @@ def threshold_monitor_status():
         # Get today's date in EST/ET timezone for accurate trading day detection
         now_est = datetime.now(pytz.timezone('America/New_York'))
         today = now_est.date()
-        is_trading_day = not _is_market_holiday(today)
-        next_trading_day = _get_next_trading_day(today) if not is_trading_day else None
+        is_trading_day = not is_market_closed(today)
+        next_trading_day = get_next_trading_day(today) if not is_trading_day else None
         
         # Ensure last_price is properly converted (handle both int and float)
         if last_price is not None:
@@ -3595,7 +3618,10 @@ def threshold_monitor_status():
 @login_required
 def api_stats():
     try:
-        stats = get_dashboard_stats()
+        # Failed queries raise, so only successful stats are cached
+        stats = _dashboard_stats_cache.get_or_fetch(
+            'stats', DASHBOARD_STATS_CACHE_TTL_SECONDS, get_dashboard_stats
+        )
         return jsonify(stats)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -3604,19 +3630,17 @@ def api_stats():
 @login_required
 def api_bots():
     try:
-        db = SessionLocal()
-        try:
-            bots = db.query(Bot).all()
-            return jsonify([{
-                'id': bot.id,
-                'name': bot.name,
-                'status': bot.status_text,
-                'state': bot.state,
-                'enabled': bot.enabled,
-                'paused': bot.paused
-            } for bot in bots])
-        finally:
-            db.close()
+        db = get_request_db()
+        # Select just the serialized columns; plain rows are much lighter than Bot objects
+        rows = db.query(Bot.id, Bot.name, Bot.state, Bot.enabled, Bot.paused).all()
+        return jsonify([{
+            'id': row.id,
+            'name': row.name,
+            'status': bot_status_text(row.enabled, row.paused),
+            'state': row.state,
+            'enabled': row.enabled,
+            'paused': row.paused
+        } for row in rows])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -3655,7 +3679,8 @@ def update_trailing_stop():
             activation_threshold, 
             trailing_percentage=trailing_percentage if trailing_mode == 'percentage' else None,
             trailing_dollar_amount=trailing_dollar_amount if trailing_mode == 'dollar' else None,
-            trailing_mode=trailing_mode
+            trailing_mode=trailing_mode,
+            session=get_request_db()
         )
         return jsonify({'success': ok, 'message': msg})
     except Exception as e:
@@ -3670,7 +3695,7 @@ def remove_trailing_stop():
         if not bot_id:
             return jsonify({'success': False, 'message': 'Missing bot ID'})
         
-        ok, msg = delete_trailing_stop(bot_id)
+        ok, msg = delete_trailing_stop(bot_id, session=get_request_db())
         return jsonify({'success': ok, 'message': msg})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -3684,44 +3709,54 @@ def not_found(error):
 def internal_error(error):
     return render_template('errors/500.html'), 500
 
-# Health check endpoint
+# Debug routes are unauthenticated and run the heaviest queries in the app,
+# so they are only reachable in debug mode or when explicitly enabled
+ENABLE_DEBUG_ROUTES = os.environ.get('ENABLE_DEBUG_ROUTES', 'false').lower() in ('1', 'true', 'yes')
+
+@app.before_request
+def guard_debug_routes():
+    if request.path.startswith('/debug/') and not (app.debug or ENABLE_DEBUG_ROUTES):
+        abort(404)
+
 @app.route('/debug/positions')
 def debug_positions():
     try:
-        db = SessionLocal()
-        try:
-            # Get all positions with the same query as positions page
-            query = db.query(Position).order_by(Position.opened_datetime.desc())
-            positions = query.all()
-            
-            result = {
-                'total_positions': len(positions),
-                'position_details': []
-            }
-            
-            for pos in positions[:5]:  # First 5 positions
-                try:
-                    pos_data = {
-                        'id': pos.id,
-                        'active': pos.active,
-                        'opened_datetime': str(pos.opened_datetime),
-                        'closed_datetime': str(pos.closed_datetime),
-                        'status_text': pos.status_text,
-                        'status_badge_class': pos.status_badge_class,
-                        'duration_text': pos.duration_text,
-                        'bot_name': pos.bot.name if pos.bot else 'No Bot',
-                        'orders_count': len(pos.orders) if pos.orders else 0
-                    }
-                    result['position_details'].append(pos_data)
-                except Exception as e:
-                    result['position_details'].append({
-                        'id': pos.id,
-                        'error': str(e)
-                    })
-            
-            return jsonify(result)
-        finally:
-            db.close()
+        db = get_request_db()
+        # Count all positions, but only load the first 5 (same ordering as the
+        # positions page) together with the bot and orders shown for each
+        total_positions = db.query(func.count(Position.id)).scalar()
+        positions = (db.query(Position)
+                     .options(joinedload(Position.bot), selectinload(Position.orders))
+                     .order_by(Position.opened_datetime.desc())
+                     .limit(5)
+                     .all())
+        
+        result = {
+            'total_positions': total_positions,
+            'position_details': []
+        }
+        
+        for pos in positions:  # First 5 positions
+            try:
+                pos_data = {
+                    'id': pos.id,
+                    'active': pos.active,
+                    'opened_datetime': str(pos.opened_datetime),
+                    'closed_datetime': str(pos.closed_datetime),
+                    'status_text': pos.status_text,
+                    'status_badge_class': pos.status_badge_class,
+                    'duration_text': pos.duration_text,
+                    'bot_name': pos.bot.name if pos.bot else 'No Bot',
+                    'orders_count': len(pos.orders) if pos.orders else 0
+                }
+                result['position_details'].append(pos_data)
+            except Exception as e:
+                result['position_details'].append({
+                    'id': pos.id,
+                    'error': str(e)
+                })
+        
+        return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -3805,6 +3840,7 @@ def debug_bot_states():
         bot_details = []
         enabled_count = 0
         paused_count = 0
+        active_count = 0
         total_count = 0
         
         for account, bot_list in bots_by_account.items():
@@ -3817,6 +3853,8 @@ def debug_bot_states():
                     enabled_count += 1
                 if paused:
                     paused_count += 1
+                if enabled and not paused:
+                    active_count += 1
                 
                 bot_details.append({
                     "id": bot.id,
@@ -3827,8 +3865,6 @@ def debug_bot_states():
                     "account": account.name if hasattr(account, 'name') else str(account)
                 })
         
-        active_count = enabled_count - paused_count
-        
         return jsonify({
             "total_bots": total_count,
             "enabled_bots": enabled_count,
@@ -3849,9 +3885,7 @@ def debug_bots_template():
     try:
         bots_by_account = get_bots_by_account()
         # Unfiltered counts (before any filter)
-        all_total_bots = sum(len(blist) for blist in bots_by_account.values())
-        all_active_bots = sum(1 for blist in bots_by_account.values() for b in blist if b.enabled and not b.paused)
-        all_inactive_bots = sum(1 for blist in bots_by_account.values() for b in blist if (not b.enabled) or b.paused)
+        all_total_bots, all_active_bots, all_inactive_bots, _ = tally_bots(bots_by_account.values())
 
         flt = request.args.get('filter')  # 'active' | 'inactive' | None
         if flt in ('active', 'inactive'):
@@ -3865,9 +3899,7 @@ def debug_bots_template():
                     filtered[account] = subset
             bots_by_account = filtered
 
-        total_bots = sum(len(blist) for blist in bots_by_account.values())
-        active_bots = sum(1 for blist in bots_by_account.values() for b in blist if b.enabled and not b.paused)
-        paused_bots = sum(1 for blist in bots_by_account.values() for b in blist if b.paused)
+        total_bots, active_bots, _, paused_bots = tally_bots(bots_by_account.values())
 
         # Convert to serializable format for debugging
         debug_data = {
@@ -3915,20 +3947,22 @@ def debug_simple_bots():
     try:
         bots_by_account = get_bots_by_account()
         
+        total_bots, active_bots, inactive_bots, _ = tally_bots(bots_by_account.values())
         result = {
             "total_accounts": len(bots_by_account),
-            "total_bots": sum(len(blist) for blist in bots_by_account.values()),
-            "active_bots": sum(1 for blist in bots_by_account.values() for b in blist if b.enabled and not b.paused),
-            "inactive_bots": sum(1 for blist in bots_by_account.values() for b in blist if (not b.enabled) or b.paused),
+            "total_bots": total_bots,
+            "active_bots": active_bots,
+            "inactive_bots": inactive_bots,
             "accounts": []
         }
         
         for account, bot_list in bots_by_account.items():
+            bot_count, account_active, account_inactive, _ = tally_bots((bot_list,))
             account_info = {
                 "name": getattr(account, 'name', str(account)),
-                "bot_count": len(bot_list),
-                "active_bots": sum(1 for b in bot_list if b.enabled and not b.paused),
-                "inactive_bots": sum(1 for b in bot_list if (not b.enabled) or b.paused)
+                "bot_count": bot_count,
+                "active_bots": account_active,
+                "inactive_bots": account_inactive
             }
             result["accounts"].append(account_info)
         
@@ -3948,9 +3982,7 @@ def debug_bots_page_simulation():
         bots_by_account = get_bots_by_account()
         
         # Unfiltered counts (before any filter)
-        all_total_bots = sum(len(blist) for blist in bots_by_account.values())
-        all_active_bots = sum(1 for blist in bots_by_account.values() for b in blist if b.enabled and not b.paused)
-        all_inactive_bots = sum(1 for blist in bots_by_account.values() for b in blist if (not b.enabled) or b.paused)
+        all_total_bots, all_active_bots, all_inactive_bots, _ = tally_bots(bots_by_account.values())
 
         flt = request.args.get('filter')  # 'active' | 'inactive' | None
         
@@ -3967,9 +3999,7 @@ def debug_bots_page_simulation():
                     filtered[account] = subset
             bots_by_account = filtered
 
-        total_bots = sum(len(blist) for blist in bots_by_account.values())
-        active_bots = sum(1 for blist in bots_by_account.values() for b in blist if b.enabled and not b.paused)
-        paused_bots = sum(1 for blist in bots_by_account.values() for b in blist if b.paused)
+        total_bots, active_bots, _, paused_bots = tally_bots(bots_by_account.values())
 
         # Test template rendering logic
         template_data = {
@@ -4120,6 +4150,13 @@ def fetch_gex_data():
         }), 500
 
 def get_schwab_account_balance():
+    """Get total account balance, cached for BALANCE_CACHE_TTL_SECONDS"""
+    return _schwab_data_cache.get_or_fetch(
+        'account_balance', BALANCE_CACHE_TTL_SECONDS, _fetch_schwab_account_balance,
+        lambda data: data.get('error') is None
+    )
+
+def _fetch_schwab_account_balance():
     """Get total account balance from Schwab API"""
     try:
         # Load Schwab token
@@ -4127,21 +4164,7 @@ def get_schwab_account_balance():
         if not token_data:
             return {'total_balance': 'N/A', 'error': 'Token not available'}
         
-        import schwab
-        
-        # Create Schwab client with token file path
-        token_path = '/app/token.json'
-        if not os.path.exists(token_path):
-            # Fallback for local development
-            app_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-            token_path = os.path.join(app_root, 'token.json')
-        
-        client = schwab.auth.client_from_token_file(
-            token_path,
-            api_key=os.environ.get('SCHWAB_API_KEY'),
-            app_secret=os.environ.get('SCHWAB_APP_SECRET'),
-            enforce_enums=False
-        )
+        client = get_schwab_client()
         
         # Get account numbers
         accounts_response = client.get_account_numbers()
@@ -4326,20 +4349,7 @@ def get_schwab_account_positions(account_hash):
         if not token_data:
             return None
         
-        import schwab
-        
-        # Create Schwab client
-        token_path = '/app/token.json'
-        if not os.path.exists(token_path):
-            app_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-            token_path = os.path.join(app_root, 'token.json')
-        
-        client = schwab.auth.client_from_token_file(
-            token_path,
-            api_key=os.environ.get('SCHWAB_API_KEY'),
-            app_secret=os.environ.get('SCHWAB_APP_SECRET'),
-            enforce_enums=False
-        )
+        client = get_schwab_client()
         
         # Get account with positions
         account_response = client.get_account(account_hash, fields=['positions'])
@@ -4391,20 +4401,7 @@ def calculate_current_open_premium_from_schwab():
         if not token_data:
             return 0.0
         
-        import schwab
-        
-        # Create Schwab client
-        token_path = '/app/token.json'
-        if not os.path.exists(token_path):
-            app_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-            token_path = os.path.join(app_root, 'token.json')
-        
-        client = schwab.auth.client_from_token_file(
-            token_path,
-            api_key=os.environ.get('SCHWAB_API_KEY'),
-            app_secret=os.environ.get('SCHWAB_APP_SECRET'),
-            enforce_enums=False
-        )
+        client = get_schwab_client()
         
         # Get account numbers
         accounts_response = client.get_account_numbers()
@@ -4488,6 +4485,13 @@ def calculate_total_open_premium():
     return calculate_total_premium_opened()
 
 def get_schwab_accounts_detail():
+    """Get detailed account information, cached for ACCOUNTS_DETAIL_CACHE_TTL_SECONDS"""
+    return _schwab_data_cache.get_or_fetch(
+        'accounts_detail', ACCOUNTS_DETAIL_CACHE_TTL_SECONDS, _fetch_schwab_accounts_detail,
+        lambda data: data.get('error') is None
+    )
+
+def _fetch_schwab_accounts_detail():
     """Get detailed account information from Schwab API including individual account balances"""
     try:
         # Load Schwab token
@@ -4495,21 +4499,7 @@ def get_schwab_accounts_detail():
         if not token_data:
             return {'accounts': [], 'error': 'Token not available'}
         
-        import schwab
-        
-        # Create Schwab client with token file path
-        token_path = '/app/token.json'
-        if not os.path.exists(token_path):
-            # Fallback for local development
-            app_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-            token_path = os.path.join(app_root, 'token.json')
-        
-        client = schwab.auth.client_from_token_file(
-            token_path,
-            api_key=os.environ.get('SCHWAB_API_KEY'),
-            app_secret=os.environ.get('SCHWAB_APP_SECRET'),
-            enforce_enums=False
-        )
+        client = get_schwab_client()
         
         # Get account numbers
         accounts_response = client.get_account_numbers()
@@ -4564,11 +4554,11 @@ def get_schwab_accounts_detail():
                         'buying_power': float(buying_power) if buying_power else 0,
                         'todays_pnl': account_metrics['profit_loss'],
                         'todays_pnl_percent': account_metrics['profit_loss_percent'],
-                        'formatted_liquidation_value': f"${float(liquidation_value):,.2f}" if liquidation_value else "$0.00",
-                        'formatted_cash_balance': f"${float(cash_balance):,.2f}" if cash_balance else "$0.00",
-                        'formatted_buying_power': f"${float(buying_power):,.2f}" if buying_power else "$0.00",
-                        'formatted_todays_pnl': f"${account_metrics['profit_loss']:,.2f}",
-                        'formatted_todays_pnl_percent': f"{account_metrics['profit_loss_percent']:+.2f}%"
+                        'formatted_liquidation_value': _usd(liquidation_value),
+                        'formatted_cash_balance': _usd(cash_balance),
+                        'formatted_buying_power': _usd(buying_power),
+                        'formatted_todays_pnl': _usd(account_metrics['profit_loss']),
+                        'formatted_todays_pnl_percent': _signed_pct(account_metrics['profit_loss_percent'])
                     })
                 else:
                     print(f"Failed to get account details for {account_hash}: {account_response.status_code}")
@@ -4604,11 +4594,11 @@ def get_schwab_accounts_detail():
         
         return {
             'accounts': detailed_accounts,
-            'total_value': f"${total_value:,.2f}",
-            'total_premium_opened': f"${total_premium_opened:,.2f}",
-            'current_open_premium': f"${current_open_premium:,.2f}",
-            'current_profit_loss': f"${current_profit_loss:,.2f}",
-            'current_profit_loss_percent': f"{current_profit_loss_percent:+.2f}%",
+            'total_value': _usd(total_value),
+            'total_premium_opened': _usd(total_premium_opened),
+            'current_open_premium': _usd(current_open_premium),
+            'current_profit_loss': _usd(current_profit_loss),
+            'current_profit_loss_percent': _signed_pct(current_profit_loss_percent),
             'account_count': len(detailed_accounts),
             'error': None
         }
@@ -4666,39 +4656,6 @@ def calculate_gex_levels(token_data):
     GEX = Gamma * Open Interest * Contract Multiplier * Spot Price^2
     """
     try:
-        import schwab
-        from datetime import date, datetime, timedelta
-        
-        def is_market_closed(check_date):
-            """Check if market is closed (weekend or US stock market holiday)"""
-            # Check weekend
-            weekday = check_date.weekday()
-            if weekday >= 5:  # Saturday = 5, Sunday = 6
-                return True
-            
-            # US Stock Market Holidays for 2025
-            holidays_2025 = [
-                date(2025, 1, 1),   # New Year's Day
-                date(2025, 1, 20),  # MLK Day
-                date(2025, 2, 17),  # Presidents' Day
-                date(2025, 4, 18),  # Good Friday
-                date(2025, 5, 26),  # Memorial Day
-                date(2025, 6, 19),  # Juneteenth
-                date(2025, 7, 4),   # Independence Day
-                date(2025, 9, 1),   # Labor Day
-                date(2025, 11, 27), # Thanksgiving
-                date(2025, 12, 25), # Christmas
-            ]
-            
-            return check_date in holidays_2025
-        
-        def get_next_trading_day(start_date):
-            """Get the next trading day after start_date"""
-            next_day = start_date + timedelta(days=1)
-            while is_market_closed(next_day):
-                next_day += timedelta(days=1)
-            return next_day
-        
         # Create Schwab client
         token_path = '/app/token.json'
         if not os.path.exists(token_path):
@@ -4712,14 +4669,9 @@ def calculate_gex_levels(token_data):
             enforce_enums=False
         )
         
-        # Get current SPX price
-        spx_response = client.get_quote('$SPX')
-        spx_price = 5800  # Default fallback
-        
-        if spx_response.status_code == 200:
-            spx_data = spx_response.json()
-            if '$SPX' in spx_data and 'quote' in spx_data['$SPX']:
-                spx_price = spx_data['$SPX']['quote'].get('lastPrice', 5800)
+        # Request the SPX quote in the background; the chain fetch below does
+        # not depend on it, so the two round-trips overlap
+        spx_future = _io_executor.submit(client.get_quote, '$SPX')
         
         # Check if market is open today, if not use next trading day
         today = date.today()
@@ -4733,14 +4685,6 @@ def calculate_gex_levels(token_data):
             print(f"Market is OPEN today ({today.strftime('%A, %Y-%m-%d')})")
         
         print(f"Fetching SPX options for GEX calculation, date: {target_date}")
-        print(f"Current SPX Price: {spx_price}")
-        
-        # Define strike range around current price (we'll filter after fetching)
-        # +/- 50 points of current SPX price
-        strike_range_min = spx_price - 50
-        strike_range_max = spx_price + 50
-        
-        print(f"Will filter strikes from {strike_range_min} to {strike_range_max}")
         
         # Fetch SPX options chain for target date
         # Try different symbol formats for SPX
@@ -4765,6 +4709,24 @@ def calculate_gex_levels(token_data):
             print(f"API Response Text: {response.text[:500] if hasattr(response, 'text') else 'No response'}")
             raise Exception(f"Failed to fetch options data with all symbols: {response.status_code}")
         
+        # Get current SPX price
+        spx_response = spx_future.result()
+        spx_price = 5800  # Default fallback
+        
+        if spx_response.status_code == 200:
+            spx_data = spx_response.json()
+            if '$SPX' in spx_data and 'quote' in spx_data['$SPX']:
+                spx_price = spx_data['$SPX']['quote'].get('lastPrice', 5800)
+        
+        print(f"Current SPX Price: {spx_price}")
+        
+        # Define strike range around current price (we'll filter after fetching)
+        # +/- 50 points of current SPX price
+        strike_range_min = spx_price - 50
+        strike_range_max = spx_price + 50
+        
+        print(f"Will filter strikes from {strike_range_min} to {strike_range_max}")
+        
         options_data = response.json()
         print(f"========== GEX DEBUG START ==========")
         print(f"Options data keys: {options_data.keys()}")
@@ -4824,8 +4786,10 @@ def calculate_gex_levels(token_data):
         exp_date_str = nearest_expiration.split(':')[0]
         
         # Calculate GEX by strike - only for nearest expiration
-        gex_by_strike = {}
+        gex_by_strike = defaultdict(lambda: {'call_gex': 0, 'put_gex': 0, 'total_gex': 0})
         contract_multiplier = 100
+        # Per-contract GEX scale (multiplier × spot², in billions), fixed for the request
+        gex_scale = contract_multiplier * spx_price * spx_price / 1_000_000_000
         
         # Process calls for nearest expiration only - filter by strike range
         call_map = options_data.get('callExpDateMap', {})
@@ -4840,13 +4804,8 @@ def calculate_gex_levels(token_data):
             strikes_with_data = 0
             first_strike_sampled = False
             
-            for strike_str, option_list in strikes.items():
-                strike = float(strike_str)
-                
-                # Filter: only process strikes within +/- 50 of current SPX
-                if not (strike_range_min <= strike <= strike_range_max):
-                    continue
-                
+            # Only process strikes within +/- 50 of current SPX
+            for strike, option_list in _strikes_in_window(strikes, strike_range_min, strike_range_max):
                 strikes_in_range += 1
                 
                 # Debug: sample first strike in range
@@ -4868,10 +4827,7 @@ def calculate_gex_levels(token_data):
                         strikes_with_data += 1
                         # Calls: negative GEX (dealers are short calls = long gamma)
                         # But we show from dealer perspective who is SHORT gamma
-                        gex = gamma * effective_oi * contract_multiplier * spx_price * spx_price / 1_000_000_000
-                        
-                        if strike not in gex_by_strike:
-                            gex_by_strike[strike] = {'call_gex': 0, 'put_gex': 0, 'total_gex': 0}
+                        gex = gamma * effective_oi * gex_scale
                         
                         gex_by_strike[strike]['call_gex'] -= gex  # Negative for calls
             
@@ -4894,13 +4850,8 @@ def calculate_gex_levels(token_data):
             strikes_with_data = 0
             first_strike_sampled = False
             
-            for strike_str, option_list in strikes.items():
-                strike = float(strike_str)
-                
-                # Filter: only process strikes within +/- 50 of current SPX
-                if not (strike_range_min <= strike <= strike_range_max):
-                    continue
-                
+            # Only process strikes within +/- 50 of current SPX
+            for strike, option_list in _strikes_in_window(strikes, strike_range_min, strike_range_max):
                 strikes_in_range += 1
                 
                 # Debug: sample first strike in range
@@ -4921,10 +4872,7 @@ def calculate_gex_levels(token_data):
                     if gamma and effective_oi:
                         strikes_with_data += 1
                         # Puts: positive GEX (dealers are short puts = short gamma)
-                        gex = gamma * effective_oi * contract_multiplier * spx_price * spx_price / 1_000_000_000
-                        
-                        if strike not in gex_by_strike:
-                            gex_by_strike[strike] = {'call_gex': 0, 'put_gex': 0, 'total_gex': 0}
+                        gex = gamma * effective_oi * gex_scale
                         
                         gex_by_strike[strike]['put_gex'] += gex  # Positive for puts
             
@@ -5086,7 +5034,7 @@ def calculate_gex_levels(token_data):
             'zero_gamma_strike': zero_gamma_strike,
             'expiration_date': exp_date_str,
             'expiration_full': nearest_expiration,
-            'interpretation': interpretation
+            'interpretation': "\n".join(interpretation)
         }
         
     except Exception as e:
@@ -5100,7 +5048,6 @@ def get_0dte_options(token_data, calls_delta_target, puts_delta_target):
     Fetch 0 DTE options data for SPX and find strikes closest to target deltas
     """
     try:
-        import schwab
         from datetime import date
         
         # Create Schwab client with token file path (schwab-py will handle the token format)
@@ -5212,6 +5159,7 @@ def find_closest_delta_option(options_data, option_type, target_delta):
             'delta': 'Error'
         }
 
+# Health check endpoint
 @app.route('/health')
 def health_check():
     try:
@@ -5225,6 +5173,9 @@ def health_check():
     except Exception as e:
         return jsonify({'status': 'unhealthy', 'error': str(e)}), 500
 
+if ENABLE_BACKGROUND_REFRESH:
+    start_schwab_refresher()
+
 if __name__ == '__main__':
     # Development server
     port = int(os.environ.get('PORT', 5000))
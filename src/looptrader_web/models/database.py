@@ -3,7 +3,7 @@
 import os
 from datetime import datetime
 from typing import List, Optional
-from sqlalchemy import create_engine, Integer, String, Boolean, Float, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, Integer, String, Boolean, Float, DateTime, ForeignKey, Text, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, Mapped, mapped_column, joinedload
 from dotenv import load_dotenv
@@ -22,8 +22,17 @@ if not DATABASE_URL:
     db_name = os.getenv('DB_NAME', 'looptrader')
     DATABASE_URL = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
 
-# Create engine and session
-engine = create_engine(DATABASE_URL, echo=False)
+# Create engine and session. The pool is sized for threaded workers and
+# pre-pings connections so ones dropped by the server are replaced quietly.
+engine_options = {}
+if not DATABASE_URL.startswith('sqlite'):
+    engine_options.update(
+        pool_size=int(os.getenv('DB_POOL_SIZE', 10)),
+        max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        pool_pre_ping=True,
+        pool_recycle=int(os.getenv('DB_POOL_RECYCLE', 300)),
+    )
+engine = create_engine(DATABASE_URL, echo=False, **engine_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
 
 # Base class for all models
@@ -78,6 +87,15 @@ class BrokerageAccount(Base):
         # Return most recent position activity
         return max(self.positions, key=lambda p: p.opened_datetime) if self.positions else None
 
+def bot_status_text(enabled, paused):
+    """Status label for a bot; usable on plain column rows as well as Bot objects"""
+    if paused:
+        return "Paused"
+    elif enabled:
+        return "Enabled"
+    else:
+        return "Disabled"
+
 class Bot(Base):
     """Bot model matching LoopTrader Pro"""
     __tablename__ = "Bot"
@@ -118,12 +136,7 @@ class Bot(Base):
     
     @property
     def status_text(self):
-        if self.paused:
-            return "Paused"
-        elif self.enabled:
-            return "Enabled"
-        else:
-            return "Disabled"
+        return bot_status_text(self.enabled, self.paused)
     
     @property
     def has_trailing_stop(self):
@@ -169,6 +182,12 @@ class Bot(Base):
 class Position(Base):
     """Position model matching LoopTrader Pro"""
     __tablename__ = "Position"
+    __table_args__ = (
+        # Per-bot lookups of active positions (Postgres partial index), and
+        # per-bot history newest first
+        Index("idx_position_active_bot", "bot_id", postgresql_where=text("active")),
+        Index("idx_position_bot_opened", "bot_id", text("opened_datetime DESC")),
+    )
     
     id = mapped_column(Integer, primary_key=True, autoincrement=True)
     active = mapped_column(Boolean, nullable=False)
@@ -563,7 +582,7 @@ class Position(Base):
             
             # Get entry price per contract from opening order
             entry_price_per_contract = abs(opening_order.price)
-            quantity = opening_order.quantity if opening_order.quantity else opening_order.filledQuantity or 1
+            quantity = opening_order.quantity or opening_order.filledQuantity or 1
             
             # Calculate position age for time decay
             from datetime import datetime, timezone
@@ -926,7 +945,7 @@ class Position(Base):
             return greeks
 
 
-def get_greeks_for_all_positions(positions, schwab_client=None):
+def get_greeks_for_all_positions(positions, schwab_client=None, opening_orders=None):
     """Get Greeks for all positions in a single batched API call.
     
     This function batches all option symbols from all positions and makes a single
@@ -936,6 +955,8 @@ def get_greeks_for_all_positions(positions, schwab_client=None):
     Args:
         positions: List of Position objects
         schwab_client: Optional pre-initialized Schwab client
+        opening_orders: Optional dict of position.id -> opening Order, for callers
+            that already located them; positions missing from it are scanned
         
     Returns:
         Dictionary mapping position.id -> {'delta': float, 'gamma': float, 'theta': float, 'vega': float}
@@ -979,11 +1000,12 @@ def get_greeks_for_all_positions(positions, schwab_client=None):
         for pos in positions:
             try:
                 # Find the opening order
-                opening_order = None
-                for order in pos.orders:
-                    if hasattr(order, 'isOpenPosition') and order.isOpenPosition:
-                        opening_order = order
-                        break
+                opening_order = opening_orders.get(pos.id) if opening_orders else None
+                if opening_order is None:
+                    for order in pos.orders:
+                        if hasattr(order, 'isOpenPosition') and order.isOpenPosition:
+                            opening_order = order
+                            break
                 
                 if not opening_order:
                     continue
@@ -1462,7 +1484,7 @@ def get_positions_batch(active_only=True, account_filter=None, include_closed=Fa
     import time
     import copy
     from sqlalchemy import func, and_
-    from sqlalchemy.orm import joinedload
+    from sqlalchemy.orm import joinedload, selectinload
     
     # Normalize account_filter
     if account_filter == '':
@@ -1497,9 +1519,11 @@ def get_positions_batch(active_only=True, account_filter=None, include_closed=Fa
         
         subq = subq.group_by(Position.bot_id).subquery()
         
-        # Main query: Join subquery to get full Position objects
+        # Main query: Join subquery to get full Position objects.
+        # Orders are a collection, so load them with one IN query instead of
+        # joining them into (and multiplying) the position rows.
         query = db.query(Position).options(
-            joinedload(Position.orders).joinedload(Order.orderLegCollection).joinedload(OrderLeg.instrument),
+            selectinload(Position.orders).selectinload(Order.orderLegCollection).joinedload(OrderLeg.instrument),
             joinedload(Position.bot)
         ).join(
             subq,
@@ -1737,7 +1761,7 @@ def update_bot(bot_id: int, name: Optional[str] = None, enabled: Optional[bool]
 
 def upsert_trailing_stop(bot_id: int, activation_threshold: float, trailing_percentage: Optional[float] = None, 
                          trailing_dollar_amount: Optional[float] = None, trailing_mode: str = 'percentage',
-                         is_active: Optional[bool] = None):
+                         is_active: Optional[bool] = None, session=None):
     """Create or update a trailing stop configuration for a bot.
     
     Args:
@@ -1747,8 +1771,9 @@ def upsert_trailing_stop(bot_id: int, activation_threshold: float, trailing_perc
         trailing_dollar_amount: Dollar amount to trail (for dollar mode)
         trailing_mode: 'percentage' or 'dollar'
         is_active: Whether the trailing stop is active
+        session: Optional caller-owned session; it is committed but not closed
     """
-    db = SessionLocal()
+    db = session if session is not None else SessionLocal()
     try:
         bot = db.query(Bot).filter(Bot.id == bot_id).first()
         if not bot:
@@ -1788,16 +1813,26 @@ def upsert_trailing_stop(bot_id: int, activation_threshold: float, trailing_perc
             try:
                 ts.validate()
             except ValueError as e:
+                db.rollback()
                 return False, str(e)
         db.commit()
         return True, "Trailing stop saved"
     except Exception as e:
+        db.rollback()
         return False, str(e)
     finally:
-        db.close()
+        if session is None:
+            db.close()
 
-def upsert_trailing_stops_batch(trailing_stop_configs: List[dict]) -> tuple[bool, int, List[dict]]:
-    """Create or update trailing stop configurations for multiple bots in a single atomic transaction.
+def upsert_trailing_stops_batch(trailing_stop_configs: List[dict], session=None, preserve_active: bool = False,
+                                allow_partial: bool = False) -> tuple[bool, int, List[dict]]:
+    """Create or update trailing stop configurations for multiple bots in a single transaction.
+    
+    The bots and their trailing stops are loaded in one query and every
+    configuration is validated before anything is changed. By default the
+    batch is all-or-nothing and resets is_active on existing stops (as
+    SmartTrail expects); the manage-trailing-stops page instead keeps
+    is_active, like upsert_trailing_stop, and saves the valid configurations.
     
     Args:
         trailing_stop_configs: List of dictionaries with keys:
@@ -1806,109 +1841,77 @@ def upsert_trailing_stops_batch(trailing_stop_configs: List[dict]) -> tuple[bool
             - trailing_percentage: Optional[float]
             - trailing_dollar_amount: Optional[float]
             - trailing_mode: str (default 'percentage')
+        session: Optional caller-owned session; it is committed but not closed
+        preserve_active: Keep is_active on existing stops instead of resetting it
+        allow_partial: Save the valid configurations even if others fail
     
     Returns:
         Tuple of (success: bool, success_count: int, errors: List[dict]) where errors contains:
             - bot_id: int
             - error: str
     """
-    db = SessionLocal()
+    db = session if session is not None else SessionLocal()
     try:
-        errors = []
-        success_count = 0
+        bot_ids = [config.get("bot_id") for config in trailing_stop_configs]
+        bots = (db.query(Bot)
+                .options(joinedload(Bot.trailing_stop_state))
+                .filter(Bot.id.in_([bot_id for bot_id in bot_ids if bot_id is not None]))
+                .all())
+        bots_by_id = {bot.id: bot for bot in bots}
         
-        # Validate all configurations before applying any changes (fail-fast)
+        # Validate all configurations before applying any changes
+        errors = []
+        valid = []
         for config in trailing_stop_configs:
             bot_id = config.get("bot_id")
-            activation_threshold = config.get("activation_threshold")
-            trailing_percentage = config.get("trailing_percentage")
-            trailing_dollar_amount = config.get("trailing_dollar_amount")
             trailing_mode = config.get("trailing_mode", "percentage")
+            values = {
+                "activation_threshold": config.get("activation_threshold"),
+                "trailing_percentage": config.get("trailing_percentage"),
+                "trailing_dollar_amount": config.get("trailing_dollar_amount"),
+                "trailing_mode": trailing_mode,
+            }
             
-            # Validate bot_id
             if bot_id is None:
                 errors.append({"bot_id": bot_id, "error": "bot_id cannot be None"})
                 continue
-            
-            # Check if bot exists
-            bot = db.query(Bot).filter(Bot.id == bot_id).first()
+            bot = bots_by_id.get(bot_id)
             if not bot:
                 errors.append({"bot_id": bot_id, "error": "Bot not found"})
                 continue
             
             # Validate mode and corresponding value
-            if trailing_mode == 'percentage' and trailing_percentage is None:
-                errors.append({
-                    "bot_id": bot_id,
-                    "error": "trailing_percentage required for percentage mode"
-                })
+            if trailing_mode == 'percentage' and values["trailing_percentage"] is None:
+                errors.append({"bot_id": bot_id, "error": "trailing_percentage required for percentage mode"})
+                continue
+            if trailing_mode == 'dollar' and values["trailing_dollar_amount"] is None:
+                errors.append({"bot_id": bot_id, "error": "trailing_dollar_amount required for dollar mode"})
                 continue
-            if trailing_mode == 'dollar' and trailing_dollar_amount is None:
-                errors.append({
-                    "bot_id": bot_id,
-                    "error": "trailing_dollar_amount required for dollar mode"
-                })
+            try:
+                TrailingStopState(**values).validate()
+            except ValueError as e:
+                errors.append({"bot_id": bot_id, "error": str(e)})
                 continue
+            valid.append((bot, values))
         
-        # If any validation errors, return early without making any changes
-        if errors:
+        # Unless partial success is allowed, any error leaves everything unchanged
+        if errors and not allow_partial:
             db.rollback()
             return False, 0, errors
         
-        # Apply all updates in a single transaction
-        for config in trailing_stop_configs:
-            bot_id = config["bot_id"]
-            activation_threshold = config["activation_threshold"]
-            trailing_percentage = config.get("trailing_percentage")
-            trailing_dollar_amount = config.get("trailing_dollar_amount")
-            trailing_mode = config.get("trailing_mode", "percentage")
-            
-            bot = db.query(Bot).filter(Bot.id == bot_id).first()
-            if not bot:
-                # Should not happen after validation, but handle gracefully
-                errors.append({"bot_id": bot_id, "error": "Bot not found during update"})
-                continue
-            
+        for bot, values in valid:
             ts = bot.trailing_stop_state
             if ts is None:
-                ts = TrailingStopState(
-                    bot_id=bot.id,
-                    activation_threshold=activation_threshold,
-                    trailing_percentage=trailing_percentage,
-                    trailing_dollar_amount=trailing_dollar_amount,
-                    trailing_mode=trailing_mode,
-                    is_active=False
-                )
-                # Validate before adding
-                try:
-                    ts.validate()
-                except ValueError as e:
-                    errors.append({"bot_id": bot_id, "error": str(e)})
-                    continue
-                db.add(ts)
+                bot.trailing_stop_state = TrailingStopState(is_active=False, **values)
             else:
-                ts.activation_threshold = activation_threshold
-                ts.trailing_percentage = trailing_percentage
-                ts.trailing_dollar_amount = trailing_dollar_amount
-                ts.trailing_mode = trailing_mode
-                ts.is_active = False  # Reset activation
-                # Validate before committing
-                try:
-                    ts.validate()
-                except ValueError as e:
-                    errors.append({"bot_id": bot_id, "error": str(e)})
-                    continue
-            
-            success_count += 1
-        
-        # If any errors occurred during update, rollback
-        if errors:
-            db.rollback()
-            return False, 0, errors
+                for field, value in values.items():
+                    setattr(ts, field, value)
+                if not preserve_active:
+                    ts.is_active = False  # Reset activation
         
         # Commit all changes at once
         db.commit()
-        return True, success_count, []
+        return not errors, len(valid), errors
         
     except Exception as e:
         db.rollback()
@@ -1919,11 +1922,12 @@ def upsert_trailing_stops_batch(trailing_stop_configs: List[dict]) -> tuple[bool
         ]
         return False, 0, errors
     finally:
-        db.close()
+        if session is None:
+            db.close()
 
-def delete_trailing_stop(bot_id: int):
+def delete_trailing_stop(bot_id: int, session=None):
     """Delete a trailing stop configuration for a bot if it exists."""
-    db = SessionLocal()
+    db = session if session is not None else SessionLocal()
     try:
         ts = db.query(TrailingStopState).filter(TrailingStopState.bot_id == bot_id).first()
         if not ts:
@@ -1932,9 +1936,31 @@ def delete_trailing_stop(bot_id: int):
         db.commit()
         return True, "Trailing stop removed"
     except Exception as e:
+        db.rollback()
         return False, str(e)
     finally:
-        db.close()
+        if session is None:
+            db.close()
+
+def delete_trailing_stops(bot_ids: List[int], session=None):
+    """Delete the trailing stop configurations of several bots with one DELETE.
+    
+    Returns:
+        Tuple of (success, deleted_count) or (False, error message)
+    """
+    db = session if session is not None else SessionLocal()
+    try:
+        deleted = db.query(TrailingStopState).filter(
+            TrailingStopState.bot_id.in_(bot_ids)
+        ).delete(synchronize_session=False)
+        db.commit()
+        return True, deleted
+    except Exception as e:
+        db.rollback()
+        return False, str(e)
+    finally:
+        if session is None:
+            db.close()
 
 # Initialize database (only create tables if they don't exist)
 def init_db():
@@ -1953,11 +1979,24 @@ def test_connection():
     except Exception as e:
         return False, f"Database connection failed: {e}"
 
+def ensure_indexes():
+    """Create the Position indexes declared above if they don't exist yet.
+
+    The schema is owned by LoopTrader Pro, so nothing here runs automatically;
+    call this once against the shared database (see README).
+    """
+    created = []
+    for index in Position.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+        created.append(index.name)
+    return created
+
 if __name__ == "__main__":
     # Test database connection
     success, message = test_connection()
     if success:
         print(f"✅ {message}")
+        print(f"🗂️ Indexes ensured: {', '.join(ensure_indexes())}")
         stats = get_dashboard_stats()
         print(f"📊 Dashboard Stats: {stats}")
     else: